@@ -1,43 +1,99 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, current_app, g, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+import functools
 import os
+import time
 import uuid
-import json
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
-import sqlite3
-import math
 import random
 
-# Import our custom services
-from services.ifc_processor import IFCProcessor
-from services.validation_service import ValidationService
-from services.health_calculator import HealthCalculator
-from utils.file_handler import FileHandler
+# Import our custom services (constructed lazily, see services/__init__.py)
+import services
+from services import get_service
+from utils.admission import AdmissionController, AdmissionRejected
+from utils.file_handler import FileHandler, UploadRejected
+from utils.storage import create_storage
+from utils.export import EXPORT_FORMATS, export_response
 from utils.helpers import generate_mock_data
-
-app = Flask(__name__)
-CORS(app)
-
-# Configuration
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ifc_dashboard.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize extensions
-db = SQLAlchemy(app)
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Initialize services
-ifc_processor = IFCProcessor()
-validation_service = ValidationService()
-health_calculator = HealthCalculator()
-file_handler = FileHandler(app.config['UPLOAD_FOLDER'])
+from config import config
+
+db = SQLAlchemy()
+api = Blueprint('api', __name__)
+
+def create_app(config_name=None):
+    """Application factory"""
+    app = Flask(__name__)
+    app.config.from_object(config[config_name or os.environ.get('FLASK_CONFIG', 'default')])
+    CORS(app)
+
+    # Initialize extensions
+    db.init_app(app)
+
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    app.extensions['file_handler'] = FileHandler(app.config['UPLOAD_FOLDER'], app.config['STORAGE_COMPRESSION'],
+                                                 create_storage(app.config), app.config['MAX_MODEL_SIZE'])
+    app.extensions['admission'] = AdmissionController.from_config(app.config)
+    if app.config['PROCESSING_MODE'] == 'queue':
+        # Uploads release their tickets once queued; the queue is the job table
+        app.extensions['admission'].backlog = pending_job_count
+
+    app.register_blueprint(api)
+
+    # Initialize database
+    with app.app_context():
+        db.create_all()
+
+    services.configure(app.config)
+    if app.config['PRELOAD_SERVICES']:
+        services.preload()
+
+    return app
+
+def get_file_handler():
+    return current_app.extensions['file_handler']
+
+def get_admission_controller():
+    return current_app.extensions['admission']
+
+def rejected_response(error):
+    """429/503 answer to an upload refused by admission control"""
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, error.status
+
+def admitted(view):
+    """Run an upload view only once admission control lets the request in"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Checked before the body is read, from the declared Content-Length
+        try:
+            ticket = get_admission_controller().admit(request.remote_addr, request.content_length)
+        except AdmissionRejected as e:
+            return rejected_response(e)
+
+        with ticket:
+            g.admission_ticket = ticket
+            return view(*args, **kwargs)
+    return wrapper
+
+_executor_lock = threading.Lock()
+
+def get_processing_executor():
+    """Process pool for CPU-bound model processing, created on first use"""
+    # Created lazily so a preloading gunicorn master never forks with a live pool
+    with _executor_lock:
+        if 'processing_executor' not in current_app.extensions:
+            current_app.extensions['processing_executor'] = ProcessPoolExecutor(
+                max_workers=current_app.config['PROCESSING_WORKERS']
+            )
+        return current_app.extensions['processing_executor']
 
 # Database Models
 class Project(db.Model):
@@ -64,9 +120,340 @@ class ValidationResult(db.Model):
     description = db.Column(db.Text)
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+class Issue(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    project_id = db.Column(db.String(36), db.ForeignKey('project.id'), nullable=False, index=True)
+    rule_name = db.Column(db.String(255), nullable=False)
+    severity = db.Column(db.String(50), nullable=False)  # critical, warning, info
+    element_id = db.Column(db.String(64))  # IFC GlobalId
+    element_type = db.Column(db.String(100))
+    description = db.Column(db.Text)
+    status = db.Column(db.String(50), default='Open')
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProcessingJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.String(36), db.ForeignKey('project.id'), nullable=False, unique=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed
+    worker_id = db.Column(db.String(100))
+    lease_expires = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ProjectCompletion(db.Model):
+    """Completed projects in completion order; nodes catch their search index up from it"""
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.String(36), db.ForeignKey('project.id'), nullable=False)
+
+ISSUE_INSERT_BATCH = 10000
+JOB_CLAIM_CANDIDATES = 10
+STREAM_BATCH = 1000
+SEARCH_SYNC_OVERLAP = 100  # completions re-read behind the watermark
+
+# Processing pipeline
+# Shared by the Flask routes and the ASGI entry point (asgi.py). analyze_file is
+# pure computation so it can run in a worker process; the other helpers write to
+# the database and need an app context.
+
+def analyze_file(file_path):
+    """Parse, validate and score an IFC file"""
+    results = get_service('ifc_processor').process_file(file_path)
+    validation_results = get_service('validation_service').validate_model(results)
+    health_score = get_service('health_calculator').calculate_score(validation_results)
+
+    # Only needed for validation; don't ship it back from a worker process
+    results.pop('property_table', None)
+    return results, validation_results, health_score
+
+def create_project(filename, file_path):
+    """Create the project record for a freshly saved upload (file_path is its storage key)"""
+    project = Project(
+        name=os.path.splitext(filename)[0],
+        filename=filename,
+        file_path=file_path,
+        file_size=get_file_handler().content_size(file_path),
+        status='Processing'
+    )
+
+    db.session.add(project)
+    db.session.commit()
+    return project
+
+def save_processing_results(project, results, validation_results, health_score):
+    """Store processing results on the project and persist rule results"""
+    # Before the project is marked completed, so whoever indexes it finds them
+    store_artifacts(project)
+
+    project.health_score = health_score['overall_score']
+    project.status = 'Completed'
+    project.total_elements = results.get('total_elements', 0)
+    project.validated_elements = results.get('validated_elements', 0)
+    project.critical_issues = health_score.get('critical_issues', 0)
+    project.warning_issues = health_score.get('warning_issues', 0)
+    project.info_issues = health_score.get('info_issues', 0)
+
+    # Save validation results
+    for rule_result in validation_results:
+        validation_record = ValidationResult(
+            project_id=project.id,
+            rule_name=rule_result['name'],
+            status=rule_result['status'],
+            issues_count=rule_result['issues'],
+            description=rule_result.get('description', '')
+        )
+        db.session.add(validation_record)
+
+    # One issue per offending element, bulk inserted in batches
+    batch = []
+    for rule_result in validation_results:
+        for element_id, element_type in rule_result.get('elements', []):
+            batch.append({
+                'project_id': project.id,
+                'rule_name': rule_result['name'],
+                'severity': rule_result['severity'],
+                'element_id': element_id,
+                'element_type': element_type,
+                'description': rule_result.get('description', '')
+            })
+            if len(batch) == ISSUE_INSERT_BATCH:
+                db.session.execute(db.insert(Issue), batch)
+                batch = []
+    if batch:
+        db.session.execute(db.insert(Issue), batch)
+
+    db.session.add(ProjectCompletion(project_id=project.id))
+    db.session.commit()
+    if current_app.config['PROCESSING_MODE'] == 'inline':
+        # Worker nodes don't serve search; web nodes catch up in the background
+        index_project(project, validation_results)
+
+def store_artifacts(project):
+    """Put the files derived from a processed model into storage next to it"""
+    file_handler = get_file_handler()
+    for path in get_service('ifc_processor').artifact_paths(file_handler.local_path(project.file_path)):
+        if os.path.exists(path):
+            file_handler.store(path)
+
+def index_project(project, validation_results=None):
+    """Add a processed project to this node's search index (its results are read back when not given)"""
+    try:
+        if validation_results is None:
+            validation_results = stored_validation_results(project)
+
+        # Only the stored property table is fetched, not the model; it is
+        # missing when the model was never parsed
+        file_handler = get_file_handler()
+        processor = get_service('ifc_processor')
+        table_key = processor.property_table_path(project.file_path)
+        property_table = None
+        if file_handler.storage.exists(table_key):
+            property_table = processor.load_property_table(file_handler.local_path(table_key))
+
+        get_service('search_index').index_project(project.id, project.name, validation_results, property_table)
+    except Exception as e:
+        # The project itself is stored; it is only missing from search results
+        print(f"Search indexing error for {project.id}: {str(e)}")
+
+def stored_validation_results(project):
+    """A processed project's offending elements per rule, as index_project takes them"""
+    results = {}
+    for rule_name, severity, element_id, element_type, description in stream_rows(
+        db.select(Issue.rule_name, Issue.severity, Issue.element_id, Issue.element_type, Issue.description)
+        .where(Issue.project_id == project.id)
+    ):
+        result = results.setdefault(rule_name, {'name': rule_name, 'severity': severity,
+                                                'description': description, 'elements': []})
+        result['elements'].append((element_id, element_type))
+    return list(results.values())
+
+def sync_search_index():
+    """
+    Index the projects completed since this node's index was last synced,
+    wherever they were processed
+
+    Completions are read from the watermark on, less SEARCH_SYNC_OVERLAP, so
+    one committed after a later one (concurrent writers) is still picked up;
+    projects already indexed are skipped. One that fails to index is retried
+    until it falls out of that overlap. A new index takes every completed
+    project once.
+    """
+    search_index = get_service('search_index')
+    watermark = search_index.watermark()
+    latest = db.session.scalar(db.select(db.func.max(ProjectCompletion.id))) or 0
+
+    if watermark is None:
+        project_ids = db.select(Project.id).where(Project.status == 'Completed')
+    else:
+        project_ids = db.select(ProjectCompletion.project_id).where(
+            ProjectCompletion.id > watermark - SEARCH_SYNC_OVERLAP, ProjectCompletion.id <= latest
+        ).order_by(ProjectCompletion.id)
+
+    for project_id in db.session.scalars(project_ids).all():
+        if not search_index.has_project(project_id):
+            index_project(db.session.get(Project, project_id))
+    search_index.set_watermark(latest)
+
+def start_search_index_sync(app):
+    """Sync this process's search index every SEARCH_SYNC_INTERVAL seconds, in a daemon thread"""
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    with get_service('search_index').sync_lock() as acquired:
+                        if acquired:
+                            sync_search_index()
+                except Exception as e:
+                    print(f"Search index sync error: {str(e)}")
+                finally:
+                    db.session.remove()
+            time.sleep(app.config['SEARCH_SYNC_INTERVAL'])
+
+    threading.Thread(target=run, daemon=True).start()
+
+_background_lock = threading.Lock()
+
+@api.before_app_request
+def start_background_tasks():
+    # On the first request of each serving process: threads don't survive the
+    # fork of a preloading gunicorn, and worker nodes never serve requests
+    app = current_app._get_current_object()
+    if app.config['SEARCH_SYNC_INTERVAL'] and app.extensions.get('search_sync_pid') != os.getpid():
+        with _background_lock:
+            if app.extensions.get('search_sync_pid') != os.getpid():
+                app.extensions['search_sync_pid'] = os.getpid()
+                start_search_index_sync(app)
+
+def mark_processing_error(project, error):
+    """Mark a project as failed without failing its upload"""
+    project.status = 'Error'
+    project.health_score = 0
+    db.session.commit()
+    print(f"Processing error: {str(error)}")
+
+# Processing jobs (PROCESSING_MODE = 'queue')
+# A worker claims a job by compare-and-set on the row: it only succeeds while the
+# job is queued or its previous owner's lease has expired. The owner renews the
+# lease with heartbeats, and results are saved in the same transaction that
+# marks the job done under the same ownership check, so a worker that lost its
+# lease to a takeover can never store a second set of results. Lease times come
+# from each node's clock, which should be kept in sync (NTP).
+
+def enqueue_processing(project):
+    """Record a job for a stored upload; a worker node will process it"""
+    db.session.add(ProcessingJob(project_id=project.id))
+    db.session.commit()
+
+def _claimable(now):
+    return db.or_(
+        ProcessingJob.status == 'queued',
+        db.and_(ProcessingJob.status == 'running', ProcessingJob.lease_expires < now)
+    )
+
+def pending_job_count():
+    """Jobs queued or being processed by a worker node"""
+    return db.session.scalar(
+        db.select(db.func.count(ProcessingJob.id)).where(ProcessingJob.status.in_(('queued', 'running')))
+    )
+
+def claim_job(worker_id):
+    """Claim the oldest queued job, or one whose worker stopped renewing its lease"""
+    now = datetime.utcnow()
+    lease = timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    candidates = db.session.execute(
+        db.select(ProcessingJob.id).where(_claimable(now)).order_by(ProcessingJob.id).limit(JOB_CLAIM_CANDIDATES)
+    ).scalars().all()
+
+    for job_id in candidates:
+        claimed = db.session.execute(
+            db.update(ProcessingJob)
+            .where(ProcessingJob.id == job_id, _claimable(now))
+            .values(status='running', worker_id=worker_id, lease_expires=now + lease,
+                    attempts=ProcessingJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            continue  # another worker got there first
+
+        job = db.session.get(ProcessingJob, job_id, populate_existing=True)
+        if job.attempts > current_app.config['JOB_MAX_ATTEMPTS']:
+            # Its workers keep dying on this model; give up on it
+            fail_job(job, worker_id, Exception(f"Gave up after {job.attempts - 1} attempts"))
+            continue
+        return job
+
+    return None
+
+def _owned(job, worker_id):
+    return db.and_(ProcessingJob.id == job.id, ProcessingJob.worker_id == worker_id,
+                   ProcessingJob.status == 'running')
+
+def renew_lease(job, worker_id):
+    """Heartbeat: extend the lease; False once the job was taken over"""
+    lease_expires = datetime.utcnow() + timedelta(seconds=current_app.config['JOB_LEASE_SECONDS'])
+    renewed = db.session.execute(
+        db.update(ProcessingJob).where(_owned(job, worker_id)).values(lease_expires=lease_expires)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return bool(renewed)
+
+def complete_job(job, worker_id, results):
+    """Save a job's results if this worker still owns it; False when it doesn't"""
+    owned = db.session.execute(
+        db.update(ProcessingJob).where(_owned(job, worker_id)).values(status='done', lease_expires=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not owned:
+        db.session.rollback()
+        return False
+
+    # Commits the job update together with the results
+    save_processing_results(db.session.get(Project, job.project_id), *results)
+    return True
+
+def fail_job(job, worker_id, error):
+    """Mark a job and its project as failed if this worker still owns it"""
+    owned = db.session.execute(
+        db.update(ProcessingJob).where(_owned(job, worker_id)).values(status='failed', lease_expires=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not owned:
+        db.session.rollback()
+        return False
+
+    mark_processing_error(db.session.get(Project, job.project_id), error)
+    return True
+
+def stream_rows(statement):
+    """Rows of a select, fetched in batches through a streaming cursor"""
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=STREAM_BATCH))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+def upload_response(project):
+    """Response body returned for an accepted upload"""
+    return {
+        'message': 'File uploaded successfully',
+        'project_id': project.id,
+        'filename': project.filename,
+        'file_size': project.file_size,
+        'status': project.status
+    }
+
+def project_status(project):
+    """Lightweight processing status of a project"""
+    return {
+        'id': project.id,
+        'status': project.status,
+        'health_score': project.health_score
+    }
+
 # API Routes
 
-@app.route('/')
+@api.route('/')
 def index():
     return jsonify({
         'message': 'IFC Model Health Dashboard API',
@@ -74,7 +461,8 @@ def index():
         'status': 'running'
     })
 
-@app.route('/api/upload', methods=['POST'])
+@api.route('/api/upload', methods=['POST'])
+@admitted
 def upload_file():
     try:
         if 'file' not in request.files:
@@ -84,73 +472,176 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
 
-        if not file_handler.allowed_file(file.filename):
-            return jsonify({'error': 'File type not allowed. Please upload .ifc files only'}), 400
+        if not get_file_handler().allowed_file(file.filename):
+            return jsonify({'error': 'File type not allowed. Please upload .ifc or .ifczip files only'}), 400
 
         # Save file
         filename = secure_filename(file.filename)
-        file_path = file_handler.save_file(file, filename)
-        file_size = os.path.getsize(file_path)
+        file_path = get_file_handler().save_file(file, filename)
 
         # Create project record
-        project = Project(
-            name=filename.replace('.ifc', '').replace('.IFC', ''),
-            filename=filename,
-            file_path=file_path,
-            file_size=file_size,
-            status='Processing'
-        )
+        project = create_project(filename, file_path)
 
-        db.session.add(project)
-        db.session.commit()
+        if current_app.config['PROCESSING_MODE'] == 'queue':
+            # A worker node processes it; clients poll the status endpoint
+            enqueue_processing(project)
+            return jsonify(upload_response(project)), 202
 
         # Process file asynchronously (simplified for demo)
         try:
-            results = ifc_processor.process_file(file_path)
-            validation_results = validation_service.validate_model(results)
-            health_score = health_calculator.calculate_score(validation_results)
-
-            # Update project with results
-            project.health_score = health_score['overall_score']
-            project.status = 'Completed'
-            project.total_elements = results.get('total_elements', 0)
-            project.validated_elements = results.get('validated_elements', 0)
-            project.critical_issues = health_score.get('critical_issues', 0)
-            project.warning_issues = health_score.get('warning_issues', 0)
-            project.info_issues = health_score.get('info_issues', 0)
-
-            # Save validation results
-            for rule_result in validation_results:
-                validation_record = ValidationResult(
-                    project_id=project.id,
-                    rule_name=rule_result['name'],
-                    status=rule_result['status'],
-                    issues_count=rule_result['issues'],
-                    description=rule_result.get('description', '')
-                )
-                db.session.add(validation_record)
-
-            db.session.commit()
+            results, validation_results, health_score = analyze_file(get_file_handler().local_path(file_path))
+            save_processing_results(project, results, validation_results, health_score)
 
         except Exception as e:
             # If processing fails, mark as error but don't fail the upload
-            project.status = 'Error'
-            project.health_score = 0
-            db.session.commit()
-            print(f"Processing error: {str(e)}")
+            mark_processing_error(project, e)
+
+        return jsonify(upload_response(project)), 200
+
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/upload/batch', methods=['POST'])
+@admitted
+def upload_batch():
+    # Federated upload: several discipline models as 'files' fields or a .zip.
+    # Each model is handed to the process pool as soon as it is saved, so saving
+    # overlaps processing and models are processed in parallel.
+    try:
+        files = [f for f in request.files.getlist('files') + request.files.getlist('file') if f.filename]
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+
+        file_handler = get_file_handler()
+        model_count = 0
+        uncompressed_size = 0
+        for file in files:
+            if file_handler.is_archive(file.filename):
+                try:
+                    archive_models, archive_size = file_handler.count_archive_models(file)
+                except zipfile.BadZipFile:
+                    return jsonify({'error': f'Invalid .zip archive: {file.filename}'}), 400
+                model_count += archive_models
+                uncompressed_size += archive_size
+            elif file_handler.allowed_file(file.filename):
+                model_count += 1
+            else:
+                return jsonify({'error': f'File type not allowed: {file.filename}. '
+                                         'Please upload .ifc, .ifczip or .zip files only'}), 400
+
+        if model_count == 0:
+            return jsonify({'error': 'No .ifc or .ifczip models found in upload'}), 400
+
+        max_files = current_app.config['BATCH_MAX_FILES']
+        if model_count > max_files:
+            return jsonify({'error': f'Too many models in batch (max {max_files})'}), 400
+
+        max_size = current_app.config['BATCH_MAX_UNCOMPRESSED_SIZE']
+        if uncompressed_size > max_size:
+            return jsonify({'error': f'Archived models too large when extracted '
+                                     f'(max {max_size / (1024*1024*1024):.1f} GB)'}), 400
+
+        # Admitted as one upload; it queues a job per model
+        try:
+            g.admission_ticket.reweigh(model_count)
+        except AdmissionRejected as e:
+            return rejected_response(e)
+
+        def saved_models():
+            for file in files:
+                if file_handler.is_archive(file.filename):
+                    yield from file_handler.save_archive(file)
+                else:
+                    filename = secure_filename(file.filename)
+                    yield filename, file_handler.save_file(file, filename)
+
+        started = time.monotonic()
+        queued = current_app.config['PROCESSING_MODE'] == 'queue'
+        executor = None if queued else get_processing_executor()
+        projects = []
+        pending = {}
+
+        save_error = None
+        try:
+            for filename, file_path in saved_models():
+                project = create_project(filename, file_path)
+                projects.append(project)
+                try:
+                    if queued:
+                        enqueue_processing(project)
+                    else:
+                        pending[executor.submit(analyze_file, file_handler.local_path(file_path))] = project
+                except Exception as e:
+                    mark_processing_error(project, e)
+                    raise
+        except Exception as e:
+            # Saving stopped partway (e.g. a corrupt archive member). The models
+            # already saved are still processed and listed with the error.
+            save_error = e
+
+        if queued:
+            if save_error is not None:
+                return batch_error_response(save_error, projects)
+
+            # Worker nodes process the models; the federated score needs them all done
+            return jsonify({
+                'message': f'{len(projects)} files queued for processing',
+                'projects': [upload_response(project) for project in projects],
+                'federated_health': None
+            }), 202
+
+        model_scores = []
+        weights = []
+        for future in as_completed(pending):
+            project = pending[future]
+            try:
+                results, validation_results, health_score = future.result()
+                save_processing_results(project, results, validation_results, health_score)
+                model_scores.append(health_score)
+                weights.append(results.get('element_count'))
+
+            except Exception as e:
+                # If processing fails, mark as error but don't fail the batch
+                mark_processing_error(project, e)
+
+        if save_error is not None:
+            return batch_error_response(save_error, projects)
+
+        # Weight by the parsed element counts; without a parsed model (no
+        # ifcopenshell) there is no real size, so models count equally
+        if None in weights:
+            weights = None
+        federated = get_service('health_calculator').calculate_federated_score(model_scores, weights)
 
         return jsonify({
-            'message': 'File uploaded successfully',
-            'project_id': project.id,
-            'filename': filename,
-            'file_size': file_size,
-            'status': project.status
+            'message': f'{len(projects)} files uploaded successfully',
+            'projects': [upload_response(project) for project in projects],
+            'federated_health': federated,
+            'processing_time': round(time.monotonic() - started, 2)
         }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/projects', methods=['GET'])
+def batch_error_response(error, projects):
+    """Answer to a batch whose saving failed partway, listing the models accepted before it did"""
+    if isinstance(error, UploadRejected):
+        message, status = str(error), error.status
+    elif isinstance(error, (zipfile.BadZipFile, zlib.error)):
+        # A member found corrupt while it was being extracted
+        message, status = f'Invalid .zip archive: {str(error)}', 400
+    else:
+        message, status = str(error), 500
+
+    return jsonify({
+        'error': message,
+        'projects': [upload_response(project) for project in projects]
+    }), status
+
+@api.route('/api/projects', methods=['GET'])
 def get_projects():
     try:
         projects = Project.query.order_by(Project.upload_date.desc()).all()
@@ -179,7 +670,7 @@ def get_projects():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/projects/<project_id>', methods=['GET'])
+@api.route('/api/projects/<project_id>', methods=['GET'])
 def get_project(project_id):
     try:
         project = Project.query.get(project_id)
@@ -222,7 +713,96 @@ def get_project(project_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/dashboard', methods=['GET'])
+@api.route('/api/projects/<project_id>/status', methods=['GET'])
+def get_project_status(project_id):
+    # Answers immediately; the ASGI entry point also supports ?wait=<seconds>
+    # long-polling without holding a worker
+    try:
+        project = Project.query.get(project_id)
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        return jsonify(project_status(project)), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>/issues/export', methods=['GET'])
+def export_issues(project_id):
+    # Streams every issue as NDJSON or CSV without building the list in memory
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+        project = Project.query.get(project_id)
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        columns = ['id', 'project_id', 'rule_name', 'severity', 'element_id', 'element_type',
+                   'description', 'status', 'created_date']
+        # No ORDER BY: sorting would have to finish before the first row is sent
+        statement = db.select(*[getattr(Issue, c) for c in columns]).where(Issue.project_id == project_id)
+
+        return export_response(columns, stream_rows(statement), export_format, f"{project.name}_issues")
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/projects/<project_id>/validation-results/export', methods=['GET'])
+def export_validation_results(project_id):
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+        project = Project.query.get(project_id)
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        columns = ['id', 'project_id', 'rule_name', 'status', 'issues_count', 'description', 'created_date']
+        statement = db.select(*[getattr(ValidationResult, c) for c in columns]) \
+            .where(ValidationResult.project_id == project_id)
+
+        return export_response(columns, stream_rows(statement), export_format,
+                               f"{project.name}_validation_results")
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/search', methods=['GET'])
+def search():
+    """
+    Search issues or elements across all projects
+    ?target=issues|elements plus filters (q, project_id, type, guid, severity,
+    rule, missing, has, property + value); answers with the matching page,
+    the total and facet counts.
+    """
+    try:
+        args = request.args
+        property_value = (args['property'], args.get('value', '')) if args.get('property') else None
+
+        return jsonify(get_service('search_index').search(
+            target=args.get('target', 'issues'),
+            q=args.get('q'),
+            project_id=args.get('project_id'),
+            element_type=args.get('type'),
+            guid=args.get('guid'),
+            severity=args.get('severity'),
+            rule_name=args.get('rule'),
+            missing=args.get('missing'),
+            has=args.get('has'),
+            property_value=property_value,
+            limit=args.get('limit', 50, type=int),
+            offset=args.get('offset', 0, type=int)
+        ))
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/dashboard', methods=['GET'])
 def get_dashboard():
     try:
         # Get dashboard statistics
@@ -275,7 +855,7 @@ def get_dashboard():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/issues/<project_id>', methods=['GET'])
+@api.route('/api/issues/<project_id>', methods=['GET'])
 def get_issues(project_id):
     try:
         project = Project.query.get(project_id)
@@ -290,26 +870,23 @@ def get_issues(project_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'database': 'connected'
+        'database': 'connected',
+        'admission': get_admission_controller().stats()
     }), 200
 
 # Error handlers
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
-# Initialize database
-with app.app_context():
-    db.create_all()
-
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
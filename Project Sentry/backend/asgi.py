@@ -0,0 +1,346 @@
+"""
+ASGI entry point for I/O-bound serving
+
+Run with: uvicorn asgi:application --host 0.0.0.0 --port $PORT
+
+Uploads are streamed to disk as they arrive and status long-polls wait on the
+event loop, so neither holds a worker. With PROCESSING_MODE = 'queue' uploads
+are only stored and queued, and worker nodes (worker.py) process them.
+CPU-bound IFC processing runs in a process pool and database access runs in
+threads. Every other route is served by the Flask app through a threaded WSGI
+bridge.
+"""
+import asyncio
+import json
+import os
+import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from multipart.multipart import MultipartParser, parse_options_header
+from werkzeug.utils import secure_filename
+
+from app import (create_app, get_processing_executor, db, Project, analyze_file, create_project,
+                 enqueue_processing, save_processing_results, mark_processing_error, upload_response,
+                 project_status)
+from utils.admission import AdmissionRejected
+from utils.file_handler import UploadRejected
+
+MAX_STATUS_WAIT = 60  # seconds
+STATUS_POLL_INTERVAL = 0.5  # seconds; first database poll of a long-poll, doubled after each
+MAX_STATUS_POLL_INTERVAL = 5  # seconds
+
+STATUS_PATH = re.compile(r'^/api/projects/([^/]+)/status$')
+
+app = create_app(os.environ.get('FLASK_CONFIG'))
+file_handler = app.extensions['file_handler']
+admission = app.extensions['admission']
+wsgi_application = WSGIMiddleware(app, workers=app.config['WSGI_THREADS'])
+with app.app_context():
+    processing_executor = get_processing_executor()
+
+# Upload chunk writes and storage copies get their own threads, so they never
+# queue behind database calls in the default executor
+file_io_executor = ThreadPoolExecutor(max_workers=app.config['UPLOAD_IO_THREADS'],
+                                      thread_name_prefix='upload-io')
+
+# project_id: event set when this process finishes processing it; long-polls
+# wait on it and only fall back to polling for work finished elsewhere
+status_events = weakref.WeakValueDictionary()
+
+
+def notify_status(project_id):
+    event = status_events.get(project_id)
+    if event is not None:
+        event.set()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamingUpload:
+    """Push parser for a multipart body that writes the file field straight to disk"""
+
+    def __init__(self, boundary, field_name='file'):
+        self.field_name = field_name
+        self.filename = None
+        self.file_path = None
+        self.error = None
+        self._out = None
+        self._header_field = b''
+        self._header_value = b''
+        self._headers = {}
+        self._parser = MultipartParser(boundary, callbacks={
+            'on_part_begin': self._on_part_begin,
+            'on_header_field': self._on_header_field,
+            'on_header_value': self._on_header_value,
+            'on_header_end': self._on_header_end,
+            'on_headers_finished': self._on_headers_finished,
+            'on_part_data': self._on_part_data,
+            'on_part_end': self._on_part_end
+        })
+
+    def write(self, chunk):
+        self._parser.write(chunk)
+
+    def finish(self):
+        self._parser.finalize()
+        self._close()
+
+    def abort(self):
+        """Discard a partially received upload"""
+        self._close()
+        if self.file_path:
+            file_handler.delete_file(self.file_path)
+            self.file_path = None
+
+    def _close(self):
+        if self._out:
+            self._out.close()
+            self._out = None
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data, start, end):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b''
+        self._header_value = b''
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b'content-disposition', b''))
+        if options.get(b'name', b'').decode() != self.field_name or self.filename is not None:
+            return
+
+        self.filename = options.get(b'filename', b'').decode('utf-8', 'replace')
+        if self.filename == '':
+            self.error = 'No file selected'
+        elif not file_handler.allowed_file(self.filename):
+            self.error = 'File type not allowed. Please upload .ifc or .ifczip files only'
+        else:
+            self.file_path, self._out = file_handler.create_upload(secure_filename(self.filename))
+
+    def _on_part_data(self, data, start, end):
+        if self._out:
+            self._out.write(data[start:end])
+
+    def _on_part_end(self):
+        self._close()
+
+
+async def send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+            *headers
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def run_in_app_context(func, *args):
+    """Run a blocking database call in a thread with an app context"""
+    def call():
+        with app.app_context():
+            try:
+                return func(*args)
+            finally:
+                db.session.remove()
+
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+async def receive_upload(scope, receive):
+    """Stream the request body through the multipart parser into the upload folder"""
+    headers = dict(scope['headers'])
+    content_type, options = parse_options_header(headers.get(b'content-type', b''))
+    if content_type != b'multipart/form-data' or b'boundary' not in options:
+        raise UploadError('No file provided')
+
+    loop = asyncio.get_running_loop()
+    max_size = app.config['MAX_CONTENT_LENGTH']
+    upload = StreamingUpload(options[b'boundary'])
+    received = 0
+
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise UploadError('Client disconnected', 499)
+
+            chunk = message.get('body', b'')
+            received += len(chunk)
+            if max_size and received > max_size:
+                raise UploadError('File too large', 413)
+
+            if chunk:
+                await loop.run_in_executor(file_io_executor, upload.write, chunk)
+            if not message.get('more_body'):
+                break
+
+        upload.finish()
+    except Exception:
+        upload.abort()
+        raise
+
+    if upload.error:
+        upload.abort()
+        raise UploadError(upload.error)
+    if upload.file_path is None:
+        raise UploadError('No file provided')
+
+    return upload
+
+
+async def upload_file(scope, receive, send):
+    # Admission is decided before any of the body is read
+    content_length = dict(scope['headers']).get(b'content-length')
+    client = scope['client'][0] if scope.get('client') else None
+    try:
+        # In a thread: admission locks its shared state and, in queue mode, counts jobs in the database
+        size = int(content_length) if content_length else None
+        ticket = await run_in_app_context(admission.admit, client, size)
+    except AdmissionRejected as e:
+        return await send_json(send, {'error': str(e), 'retry_after': e.retry_after}, e.status,
+                               [(b'retry-after', str(e.retry_after).encode())])
+
+    try:
+        await process_upload(scope, receive, send)
+    finally:
+        # Releasing locks the shared state too, so off the event loop like admit
+        await asyncio.get_running_loop().run_in_executor(None, ticket.release)
+
+
+async def process_upload(scope, receive, send):
+    try:
+        upload = await receive_upload(scope, receive)
+    except UploadError as e:
+        return await send_json(send, {'error': str(e)}, e.status)
+
+    try:
+        def create(filename, file_path):
+            project = create_project(filename, file_path)
+            if app.config['PROCESSING_MODE'] == 'queue':
+                enqueue_processing(project)
+                return project.id, upload_response(project)
+            return project.id, None
+
+        loop = asyncio.get_running_loop()
+        try:
+            file_path = await loop.run_in_executor(file_io_executor, file_handler.store_upload, upload.file_path)
+        except UploadRejected as e:
+            return await send_json(send, {'error': str(e)}, e.status)
+        filename = secure_filename(upload.filename)
+        project_id, queued = await run_in_app_context(create, filename, file_path)
+        if queued:
+            # A worker node processes it; clients poll the status endpoint
+            return await send_json(send, queued, 202)
+
+        try:
+            local_path = await loop.run_in_executor(file_io_executor, file_handler.local_path, file_path)
+            results = await loop.run_in_executor(processing_executor, analyze_file, local_path)
+
+            def save(project_id, results):
+                project = Project.query.get(project_id)
+                save_processing_results(project, *results)
+                return upload_response(project)
+
+            response = await run_in_app_context(save, project_id, results)
+
+        except Exception as e:
+            def fail(project_id, error):
+                # If processing fails, mark as error but don't fail the upload
+                project = Project.query.get(project_id)
+                mark_processing_error(project, error)
+                return upload_response(project)
+
+            response = await run_in_app_context(fail, project_id, e)
+
+        notify_status(project_id)
+        await send_json(send, response)
+
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def get_project_status(scope, receive, send, project_id):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    try:
+        wait = min(MAX_STATUS_WAIT, max(0.0, float(query.get('wait', ['0'])[0])))
+    except ValueError:
+        return await send_json(send, {'error': 'wait must be a number of seconds'}, 400)
+
+    def load(project_id):
+        project = Project.query.get(project_id)
+        return project_status(project) if project else None
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    interval = STATUS_POLL_INTERVAL
+
+    try:
+        while True:
+            status = await run_in_app_context(load, project_id)
+            if status is None:
+                return await send_json(send, {'error': 'Project not found'}, 404)
+            if status['status'] != 'Processing' or loop.time() >= deadline:
+                return await send_json(send, status)
+
+            # Woken as soon as this process finishes it; otherwise poll with backoff
+            event = status_events.get(project_id)
+            if event is None:
+                event = status_events[project_id] = asyncio.Event()
+            try:
+                await asyncio.wait_for(event.wait(), min(interval, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            interval = min(MAX_STATUS_POLL_INTERVAL, interval * 2)
+
+    except Exception as e:
+        await send_json(send, {'error': str(e)}, 500)
+
+
+async def lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            processing_executor.shutdown(wait=False)
+            file_io_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(scope, receive, send)
+
+    if scope['type'] == 'http':
+        path = scope['path']
+        method = scope['method']
+
+        if path == '/api/upload' and method == 'POST':
+            return await upload_file(scope, receive, send)
+
+        match = STATUS_PATH.match(path)
+        if match and method == 'GET':
+            return await get_project_status(scope, receive, send, match.group(1))
+
+    await wsgi_application(scope, receive, send)
@@ -0,0 +1,57 @@
+"""
+Startup-time benchmark
+
+Measures, in fresh interpreters, how long it takes to import the app module,
+build an app with create_app() and get through the first service use. Run from
+the backend folder:
+
+    python benchmarks/startup_benchmark.py [--runs 10] [--config testing]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = {
+    'import app': 'import app',
+    'create_app()': 'import app; app.create_app({config!r})',
+    'create_app() + services': 'import app, services; app.create_app({config!r}); services.preload()'
+}
+
+TIMER = '''
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+'''
+
+
+def time_stage(code, runs):
+    """Run code in `runs` fresh interpreters and return the timings in ms"""
+    timings = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', TIMER.format(code=code)],
+            cwd=BACKEND_DIR
+        )
+        timings.append(float(output.decode().strip().splitlines()[-1]) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='testing')
+    args = parser.parse_args()
+
+    print(f"{'stage':<28}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, code in STAGES.items():
+        timings = time_stage(code.format(config=args.config), args.runs)
+        print(f"{name:<28}{statistics.median(timings):>12.1f}{min(timings):>10.1f}{max(timings):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
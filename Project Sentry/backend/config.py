@@ -4,17 +4,92 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'static/uploads'
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB
+    # Largest IFC text a single model may decompress to (.ifczip uploads,
+    # batch members); it is parsed in memory
+    MAX_MODEL_SIZE = int(os.environ.get('MAX_MODEL_SIZE') or 2 * 1024 * 1024 * 1024)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///ifc_dashboard.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Where uploads live once saved (utils/storage.py): 'local' keeps them in
+    # UPLOAD_FOLDER; 'directory' puts them in STORAGE_BUCKET (a directory shared
+    # by every node) and uses UPLOAD_FOLDER as the local cache
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'local'
+    STORAGE_BUCKET = os.environ.get('STORAGE_BUCKET')
+
+    # Compress stored .ifc uploads at rest: 'none', 'gzip' or 'zstd'
+    STORAGE_COMPRESSION = os.environ.get('STORAGE_COMPRESSION') or 'none'
+
+    # Build services in create_app instead of on first request. Worth it when
+    # gunicorn preloads the app, so forked workers share them copy-on-write.
+    PRELOAD_SERVICES = os.environ.get('PRELOAD_SERVICES', '').lower() in ('1', 'true', 'yes')
+
+    # Worker processes for model processing (batch uploads and asgi.py)
+    PROCESSING_WORKERS = int(os.environ.get('PROCESSING_WORKERS') or os.cpu_count() or 1)
+
+    # Geometry stage: ifcopenshell iterator threads and a per-model time limit
+    # in seconds (0 for none). Elements left over when it runs out get no box.
+    # Threads default to the CPUs left per processing worker, so a full pool
+    # doesn't run PROCESSING_WORKERS x cpu_count threads.
+    GEOMETRY_WORKERS = int(os.environ.get('GEOMETRY_WORKERS') or
+                           max(1, (os.cpu_count() or 1) // PROCESSING_WORKERS))
+    GEOMETRY_TIME_BUDGET = float(os.environ.get('GEOMETRY_TIME_BUDGET') or 300)
+
+    # Declarative custom validation rules (see services/rule_engine.py)
+    CUSTOM_RULES_PATH = os.environ.get('CUSTOM_RULES_PATH') or \
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'custom_rules.json')
+
+    # Custom rule outcomes memoized per model content (services/result_memo.py),
+    # so re-validating a model seen before skips evaluating large rule sets;
+    # set RESULT_MEMO_PATH empty to turn it off
+    RESULT_MEMO_PATH = os.environ.get('RESULT_MEMO_PATH', 'result_memo.db')
+    RESULT_MEMO_MAX_ENTRIES = int(os.environ.get('RESULT_MEMO_MAX_ENTRIES') or 1000)  # models
+
+    # Cross-project search index (SQLite database, see services/search_index.py)
+    SEARCH_INDEX_PATH = os.environ.get('SEARCH_INDEX_PATH') or 'search_index.db'
+    # Seconds between background catch-ups of the index with projects completed
+    # on other nodes (0 disables)
+    SEARCH_SYNC_INTERVAL = float(os.environ.get('SEARCH_SYNC_INTERVAL') or 30)
+
+    # Batch uploads: most models accepted per request, and most bytes the models
+    # in its .zip archives may expand to
+    BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES') or 100)
+    BATCH_MAX_UNCOMPRESSED_SIZE = int(os.environ.get('BATCH_MAX_UNCOMPRESSED_SIZE') or 4 * 1024 * 1024 * 1024)
+
+    # 'inline' processes uploads in the web process; 'queue' only records a
+    # job that worker nodes (worker.py) claim under a lease renewed by heartbeats
+    PROCESSING_MODE = os.environ.get('PROCESSING_MODE') or 'inline'
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 60)
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 2)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)
+
+    # Upload admission control (utils/admission.py): most upload bytes in
+    # flight, uploads admitted at once (in queue mode, counting the jobs still
+    # queued or running on worker nodes), and the free disk / memory to keep
+    ADMISSION_MAX_INFLIGHT_BYTES = int(os.environ.get('ADMISSION_MAX_INFLIGHT_BYTES') or 2 * 1024 ** 3)
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE') or 2 * PROCESSING_WORKERS)
+    ADMISSION_MIN_FREE_DISK = int(os.environ.get('ADMISSION_MIN_FREE_DISK') or 1024 ** 3)
+    ADMISSION_MIN_FREE_MEMORY = int(os.environ.get('ADMISSION_MIN_FREE_MEMORY') or 512 * 1024 ** 2)
+
+    # ASGI serving (asgi.py)
+    WSGI_THREADS = int(os.environ.get('WSGI_THREADS') or 10)
+    UPLOAD_IO_THREADS = int(os.environ.get('UPLOAD_IO_THREADS') or 16)
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
 class ProductionConfig(Config):
     DEBUG = False
+    PRELOAD_SERVICES = True
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SEARCH_INDEX_PATH = 'file:search_index?mode=memory&cache=shared'
+    RESULT_MEMO_PATH = 'file:result_memo?mode=memory&cache=shared'
 
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
@@ -0,0 +1,30 @@
+# Loaded automatically by gunicorn from the working directory.
+import gc
+
+from config import Config
+
+# Build the app (and, with PRELOAD_SERVICES, its services) once in the master
+# so workers fork with it already loaded instead of each importing it again.
+preload_app = True
+
+# Sync workers process uploads inline, and the geometry stage alone may take up
+# to GEOMETRY_TIME_BUDGET; a worker killed mid-request leaves its project
+# 'Processing' forever. Allow the budget plus time for parsing and validation
+# (0, no budget, disables the timeout too).
+timeout = int(Config.GEOMETRY_TIME_BUDGET) + 120 if Config.GEOMETRY_TIME_BUDGET else 0
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach. Otherwise
+    # the first collection in each worker touches every inherited object and
+    # defeats copy-on-write sharing.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # The master opened database connections while building the app
+    # (db.create_all); drop the pool inherited from it without closing the
+    # master's connections, so each worker opens its own.
+    from app import db
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
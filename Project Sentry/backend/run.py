@@ -1,6 +1,8 @@
-from app import app
+from app import create_app
 import os
 
+app = create_app(os.environ.get('FLASK_CONFIG'))
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
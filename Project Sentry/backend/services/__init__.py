@@ -0,0 +1,61 @@
+"""
+Lazily constructed service singletons
+
+Service modules, and the parsers and rule plugins they pull in, are imported on
+first use so importing the app stays cheap. preload() builds everything up
+front; call it before forking workers so they share the loaded modules
+copy-on-write. configure() passes app settings to services built afterwards.
+"""
+import importlib
+import threading
+
+# name: (module, class, {constructor argument: config key})
+SERVICES = {
+    'ifc_processor': ('services.ifc_processor', 'IFCProcessor', {
+        'geometry_workers': 'GEOMETRY_WORKERS',
+        'geometry_time_budget': 'GEOMETRY_TIME_BUDGET',
+        'max_model_size': 'MAX_MODEL_SIZE'
+    }),
+    'validation_service': ('services.validation_service', 'ValidationService', {
+        'custom_rules_path': 'CUSTOM_RULES_PATH',
+        'result_memo_path': 'RESULT_MEMO_PATH',
+        'result_memo_size': 'RESULT_MEMO_MAX_ENTRIES'
+    }),
+    'health_calculator': ('services.health_calculator', 'HealthCalculator', {}),
+    'search_index': ('services.search_index', 'SearchIndex', {
+        'path': 'SEARCH_INDEX_PATH'
+    })
+}
+
+_instances = {}
+_settings = {}
+_lock = threading.Lock()
+
+
+def get_service(name):
+    """Return the shared instance of a service, constructing it on first use"""
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        if name not in _instances:
+            module_name, class_name, options = SERVICES[name]
+            service_class = getattr(importlib.import_module(module_name), class_name)
+            kwargs = {arg: _settings[key] for arg, key in options.items() if key in _settings}
+            _instances[name] = service_class(**kwargs)
+        return _instances[name]
+
+
+def configure(settings):
+    """Use settings (e.g. app.config) for services; drops already built ones"""
+    with _lock:
+        _settings.clear()
+        _settings.update(settings)
+        _instances.clear()
+
+
+def preload():
+    """Construct every service now instead of on first request"""
+    for name in SERVICES:
+        get_service(name)
@@ -0,0 +1,80 @@
+import os
+import time
+
+import numpy as np
+
+class GeometryIndex:
+    """
+    Axis-aligned bounding boxes of the tessellated elements of a model
+
+    boxes is an (n, 6) float64 array of min_x, min_y, min_z, max_x, max_y, max_z
+    in world coordinates, row i belonging to guids[i]. complete is False when
+    the time budget ran out before every element was tessellated.
+    """
+
+    def __init__(self, guids, boxes, complete=True):
+        self.guids = guids
+        self.boxes = boxes
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.guids)
+
+    def bounds(self):
+        """Model-wide bounding box, or None when nothing was tessellated"""
+        if not len(self.boxes):
+            return None
+
+        mins = self.boxes[:, :3].min(axis=0)
+        maxs = self.boxes[:, 3:].max(axis=0)
+        return dict(zip(
+            ['min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z'],
+            (round(float(v), 2) for v in np.concatenate([mins, maxs]))
+        ))
+
+    def save(self, path):
+        """Write the boxes to a .npz file (already dense floats, so uncompressed)"""
+        np.savez(path, guids=np.array(self.guids, dtype=str), boxes=self.boxes, complete=self.complete)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['guids'].tolist(), data['boxes'], bool(data['complete']))
+
+class GeometryProcessor:
+    """Tessellates a model with ifcopenshell's geometry iterator to compute bounding boxes"""
+
+    def __init__(self, workers=None, time_budget=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.time_budget = time_budget  # seconds, None or 0 for no limit
+
+    def compute(self, model):
+        import ifcopenshell.geom
+
+        settings = ifcopenshell.geom.settings()
+        if hasattr(settings, 'USE_WORLD_COORDS'):
+            settings.set(settings.USE_WORLD_COORDS, True)
+        else:
+            settings.set('use-world-coords', True)  # ifcopenshell >= 0.8
+
+        deadline = time.monotonic() + self.time_budget if self.time_budget else None
+        guids = []
+        boxes = []
+        complete = True
+
+        iterator = ifcopenshell.geom.iterator(settings, model, self.workers)
+        if iterator.initialize():
+            while True:
+                shape = iterator.get()
+                verts = np.asarray(shape.geometry.verts, dtype=np.float64).reshape(-1, 3)
+                if len(verts):
+                    guids.append(shape.guid)
+                    boxes.append(np.concatenate([verts.min(axis=0), verts.max(axis=0)]))
+
+                if not iterator.next():
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    complete = False
+                    break
+
+        return GeometryIndex(guids, np.array(boxes, dtype=np.float64).reshape(-1, 6), complete)
@@ -89,6 +89,56 @@ class HealthCalculator:
             'health_grade': self._get_health_grade(overall_score)
         }
 
+    def calculate_federated_score(self, model_scores, weights=None):
+        """
+        Combine the health scores of the discipline models of a federated project
+        Scores are averaged weighted by model size (e.g. element counts) and
+        issue counts are summed
+        """
+        if not model_scores:
+            return self.calculate_score([])
+
+        if not weights or not any(weights):
+            weights = [1] * len(model_scores)
+        total_weight = sum(weights)
+
+        overall_score = sum(s['overall_score'] * w for s, w in zip(model_scores, weights)) / total_weight
+
+        # Weighted category scores over the models that report each category
+        category_totals = {}
+        for score, weight in zip(model_scores, weights):
+            for category, value in score.get('category_scores', {}).items():
+                total, category_weight = category_totals.get(category, (0, 0))
+                category_totals[category] = (total + value * weight, category_weight + weight)
+        category_scores = {
+            category: round(total / category_weight, 1) if category_weight else 0
+            for category, (total, category_weight) in category_totals.items()
+        }
+
+        # Highest priority recommendations across models, without duplicates
+        recommendations = {}
+        for score in model_scores:
+            for recommendation in score.get('recommendations', []):
+                recommendations.setdefault(recommendation['title'], recommendation)
+        priority_order = {'high': 0, 'medium': 1, 'low': 2}
+        recommendations = sorted(recommendations.values(), key=lambda r: priority_order.get(r['priority'], 3))
+
+        critical_issues = sum(s.get('critical_issues', 0) for s in model_scores)
+        warning_issues = sum(s.get('warning_issues', 0) for s in model_scores)
+        info_issues = sum(s.get('info_issues', 0) for s in model_scores)
+
+        return {
+            'overall_score': round(overall_score, 1),
+            'category_scores': category_scores,
+            'total_issues': critical_issues + warning_issues + info_issues,
+            'critical_issues': critical_issues,
+            'warning_issues': warning_issues,
+            'info_issues': info_issues,
+            'recommendations': recommendations[:5],
+            'health_grade': self._get_health_grade(overall_score),
+            'models': len(model_scores)
+        }
+
     def _get_health_grade(self, score):
         """Convert numeric score to letter grade"""
         if score >= 90:
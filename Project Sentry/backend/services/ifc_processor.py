@@ -1,38 +1,163 @@
 import os
 import math
 import random
+import tempfile
 from datetime import datetime
 
+from services.property_extractor import PropertyExtractor, PropertyTable
+from services.spatial_graph import SpatialGraph, SpatialGraphBuilder
+from services.geometry_processor import GeometryIndex, GeometryProcessor
+from utils.file_handler import COPY_CHUNK_SIZE, content_size, is_compressed, open_stream
+
 class IFCProcessor:
-    def __init__(self):
+    def __init__(self, geometry_workers=None, geometry_time_budget=None, max_model_size=None):
         self.supported_versions = ['IFC2X3', 'IFC4', 'IFC4X1', 'IFC4X3']
+        self.max_model_size = max_model_size
+        self.geometry_processor = GeometryProcessor(geometry_workers, geometry_time_budget)
+
+        # Imported with the service rather than on the first upload, so that
+        # services.preload() loads it (the heaviest import) before workers fork
+        try:
+            import ifcopenshell
+            import ifcopenshell.geom
+        except ImportError:
+            ifcopenshell = None
+        self.ifcopenshell = ifcopenshell
 
     def process_file(self, file_path):
         """
         Process IFC file and extract basic information
-        For demo purposes, we'll simulate processing with mock data
+        Model-wide figures are still simulated with mock data; property sets, the
+        spatial structure and bounding boxes are extracted for real when
+        ifcopenshell is installed
         """
         try:
             # Get file info
-            file_size = os.path.getsize(file_path)
+            file_size = content_size(file_path)
             filename = os.path.basename(file_path)
+            self._check_size(file_size)
 
-            # Simulate IFC processing (in real implementation, use ifcopenshell)
+            # Simulate IFC processing
             # This creates realistic mock data based on file size
             mock_results = self._generate_mock_results(file_size, filename)
 
+            model = self.open_model(file_path)
+            if model is not None:
+                property_table = PropertyExtractor().extract(model)
+                property_table.save(self.property_table_path(file_path))
+
+                mock_results['ifc_version'] = model.schema
+                mock_results['properties_found'] = len(property_table)
+                mock_results['element_count'] = property_table.element_count
+                mock_results['property_table'] = property_table
+                mock_results['property_coverage'] = property_table.coverage_by_type()
+
+                spatial_graph = SpatialGraphBuilder().build(model)
+                spatial_graph.save(self.spatial_graph_path(file_path))
+                mock_results.update(spatial_graph.summary())
+                mock_results['elements_by_type']['IfcSpace'] = mock_results['spaces']
+                mock_results['elements_by_type']['IfcBuildingStorey'] = mock_results['building_stories']
+
+                geometry_index = self.geometry_processor.compute(model)
+                geometry_index.save(self.geometry_index_path(file_path))
+                mock_results['geometry_elements'] = len(geometry_index)
+                mock_results['geometry_complete'] = geometry_index.complete
+                # None rather than simulated bounds when nothing was tessellated
+                mock_results['bounding_box'] = geometry_index.bounds()
+
             return mock_results
 
         except Exception as e:
             raise Exception(f"Error processing IFC file: {str(e)}")
 
+    def open_model(self, file_path):
+        """Open the model with ifcopenshell, or return None if it is not installed"""
+        ifcopenshell = self.ifcopenshell
+        if ifcopenshell is None:
+            return None
+
+        if not is_compressed(file_path):
+            return ifcopenshell.open(file_path)
+
+        # .ifczip, .ifc.gz and .ifc.zst are inflated to a temporary file next to
+        # them; parsing from a string would hold the bytes, the decoded text and
+        # ifcopenshell's own copy at once. Declared sizes can lie, so the limit
+        # is enforced on what is actually inflated.
+        with tempfile.NamedTemporaryFile(suffix='.ifc', dir=os.path.dirname(file_path) or None,
+                                         delete=False) as inflated:
+            try:
+                with open_stream(file_path) as stream:
+                    size = 0
+                    while chunk := stream.read(COPY_CHUNK_SIZE):
+                        size += len(chunk)
+                        self._check_size(size)
+                        inflated.write(chunk)
+                inflated.close()
+                return ifcopenshell.open(inflated.name)
+            finally:
+                os.remove(inflated.name)
+
+    def _check_size(self, size):
+        if self.max_model_size and size > self.max_model_size:
+            raise Exception(f"Model too large when decompressed (max {self.max_model_size / (1024*1024):.0f} MB)")
+
+    def property_table_path(self, file_path):
+        """Where the extracted property table of an upload is stored"""
+        return f"{file_path}.properties.npz"
+
+    def spatial_graph_path(self, file_path):
+        """Where the spatial structure graph of an upload is stored"""
+        return f"{file_path}.spatial.npz"
+
+    def geometry_index_path(self, file_path):
+        """Where the element bounding boxes of an upload are stored"""
+        return f"{file_path}.geometry.npz"
+
+    def artifact_paths(self, file_path):
+        """Every file derived from an upload and stored next to it"""
+        return [self.property_table_path(file_path), self.spatial_graph_path(file_path),
+                self.geometry_index_path(file_path)]
+
+    def load_geometry_index(self, file_path):
+        """Element bounding boxes of an upload, tessellated once and then read from disk"""
+        index_path = self.geometry_index_path(file_path)
+        if os.path.exists(index_path):
+            return GeometryIndex.load(index_path)
+
+        model = self.open_model(file_path)
+        if model is None:
+            raise Exception("ifcopenshell is required to compute geometry")
+
+        geometry_index = self.geometry_processor.compute(model)
+        geometry_index.save(index_path)
+        return geometry_index
+
+    def load_property_table(self, table_path):
+        """Property table saved at table_path (see property_table_path)"""
+        return PropertyTable.load(table_path)
+
+    def load_spatial_graph(self, file_path):
+        """Spatial structure graph of an upload, built once and then read from disk"""
+        graph_path = self.spatial_graph_path(file_path)
+        if os.path.exists(graph_path):
+            return SpatialGraph.load(graph_path)
+
+        model = self.open_model(file_path)
+        if model is None:
+            raise Exception("ifcopenshell is required to build the spatial structure")
+
+        spatial_graph = SpatialGraphBuilder().build(model)
+        spatial_graph.save(graph_path)
+        return spatial_graph
+
     def _generate_mock_results(self, file_size, filename):
         """Generate realistic mock data for demo"""
         # Estimate elements based on file size (rough approximation)
         estimated_elements = max(100, int(file_size / 10000))  # ~10KB per element average
 
-        # Add some randomization
-        total_elements = estimated_elements + random.randint(-50, 200)
+        # Add some randomization (never below the estimate's floor, which the
+        # space count below relies on)
+        total_elements = max(100, estimated_elements + random.randint(-50, 200))
         validated_elements = int(total_elements * random.uniform(0.85, 0.98))
 
         # Mock geometric data
@@ -76,20 +201,25 @@ class IFCProcessor:
 
     def extract_properties(self, file_path):
         """Extract property sets from IFC file"""
-        # Mock property extraction
+        table_path = self.property_table_path(file_path)
+        if os.path.exists(table_path):
+            property_table = PropertyTable.load(table_path)
+        else:
+            model = self.open_model(file_path)
+            if model is None:
+                raise Exception("ifcopenshell is required to extract properties")
+            property_table = PropertyExtractor().extract(model)
+
+        pset_names = property_table.pset_pool.values
+        coverage = property_table.coverage_by_type()
+        elements = sum(c['elements'] for c in coverage.values())
+        covered = sum(c['covered'] for c in coverage.values())
+
         return {
-            'common_property_sets': [
-                'Pset_WallCommon',
-                'Pset_SlabCommon', 
-                'Pset_BeamCommon',
-                'Pset_DoorCommon',
-                'Pset_WindowCommon'
-            ],
-            'custom_property_sets': [
-                'ProjectSpecific_Materials',
-                'CompanyStandard_Elements'
-            ],
-            'properties_coverage': random.uniform(0.6, 0.95)
+            'common_property_sets': sorted(name for name in pset_names if name.startswith('Pset_')),
+            'custom_property_sets': sorted(name for name in pset_names if not name.startswith('Pset_')),
+            'properties_coverage': covered / max(1, elements),
+            'coverage_by_type': coverage
         }
 
     def get_model_statistics(self, results):
@@ -97,8 +227,15 @@ class IFCProcessor:
         if not results:
             return {}
 
+        storey_counts = [storey['elements'] for storey in results.get('storey_counts', [])]
+        if storey_counts:
+            # Elements actually contained per storey, from the spatial graph
+            element_density = sum(storey_counts) / len(storey_counts)
+        else:
+            element_density = results['total_elements'] / max(1, results.get('building_stories', 1))
+
         return {
-            'element_density': results['total_elements'] / max(1, results.get('building_stories', 1)),
+            'element_density': element_density,
             'validation_coverage': results['validated_elements'] / max(1, results['total_elements']),
             'geometry_complexity': 'High' if results['total_elements'] > 5000 else 'Medium' if results['total_elements'] > 1000 else 'Low'
         }
@@ -0,0 +1,302 @@
+import hashlib
+from array import array
+
+import numpy as np
+
+# Subclasses that share their parent's property sets (IfcWallStandardCase uses Pset_WallCommon)
+CASE_SUFFIXES = ('StandardCase', 'ElementedCase')
+
+def common_pset_name(type_name):
+    """Pset_<Type>Common expected for an IFC class"""
+    name = type_name[3:] if type_name.startswith('Ifc') else type_name
+    for suffix in CASE_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            name = name[:-len(suffix)]
+            break
+    return f"Pset_{name}Common"
+
+def is_physical(entity):
+    """Built elements (walls, doors, ...); openings, projections and virtual boundaries are not"""
+    return entity.is_a('IfcElement') and not entity.is_a('IfcFeatureElement') and \
+        not entity.is_a('IfcVirtualElement')
+
+class StringPool:
+    """Interns strings to dense integer ids"""
+
+    def __init__(self, values=()):
+        self.values = []
+        self._ids = {}
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self.values)
+            self._ids[value] = string_id
+            self.values.append(value)
+        return string_id
+
+    def get(self, value, default=-1):
+        return self._ids.get(value, default)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, string_id):
+        return self.values[string_id]
+
+class PropertyTable:
+    """
+    Columnar store of the single-value properties of a model
+
+    Each property row is (element, pset, property, value) with every field an
+    integer id: elements index the element arrays, names and values index string
+    pools. Numeric values are also kept as float64 (NaN when not numeric), so
+    coverage and predicates are computed with array operations instead of walking
+    nested dicts. element_physical flags built elements (walls, doors, ...) as
+    opposed to spatial structure, openings and other products.
+    """
+
+    def __init__(self, element_guids, element_types, element_physical, element_type_pool, pset_pool,
+                 property_pool, value_pool, row_element, row_pset, row_property, row_value, row_number):
+        self.element_guids = element_guids
+        self.element_types = element_types
+        self.element_physical = element_physical
+        self.element_type_pool = element_type_pool
+        self.pset_pool = pset_pool
+        self.property_pool = property_pool
+        self.value_pool = value_pool
+        self.row_element = row_element
+        self.row_pset = row_pset
+        self.row_property = row_property
+        self.row_value = row_value
+        self.row_number = row_number
+
+    @property
+    def element_count(self):
+        return len(self.element_types)
+
+    def __len__(self):
+        return len(self.row_element)
+
+    def type_counts(self):
+        """Number of elements of each type"""
+        counts = np.bincount(self.element_types, minlength=len(self.element_type_pool))
+        return {self.element_type_pool[i]: int(count) for i, count in enumerate(counts) if count}
+
+    def describe_elements(self, indices):
+        """(GlobalId, IFC type) of each given element"""
+        type_names = self.element_type_pool.values
+        return [(self.element_guids[i], type_names[self.element_types[i]]) for i in indices]
+
+    def has_pset(self, pset_ids):
+        """
+        Boolean mask over elements that carry the expected property set
+
+        pset_ids is either a single pset id or an array giving the expected pset
+        id of every element.
+        """
+        pset_ids = np.asarray(pset_ids)
+        if pset_ids.ndim:
+            expected = pset_ids[self.row_element]
+        else:
+            expected = pset_ids
+        mask = np.zeros(self.element_count, dtype=bool)
+        mask[self.row_element[self.row_pset == expected]] = True
+        return mask
+
+    def column(self, pset_name, property_name):
+        """
+        Per-element value of one property
+
+        Returns (value_ids, numbers): value ids index value_pool and are -1 where
+        the element lacks the property; numbers are NaN unless the value is numeric.
+        """
+        value_ids = np.full(self.element_count, -1, dtype=np.int32)
+        numbers = np.full(self.element_count, np.nan)
+
+        pset_id = self.pset_pool.get(pset_name)
+        property_id = self.property_pool.get(property_name)
+        if pset_id >= 0 and property_id >= 0:
+            rows = (self.row_pset == pset_id) & (self.row_property == property_id)
+            value_ids[self.row_element[rows]] = self.row_value[rows]
+            numbers[self.row_element[rows]] = self.row_number[rows]
+
+        return value_ids, numbers
+
+    def common_pset_ids(self):
+        """Expected Pset_<Type>Common id for every element (-1 when never used)"""
+        type_psets = np.array([
+            self.pset_pool.get(common_pset_name(name))
+            for name in self.element_type_pool.values
+        ], dtype=np.int32)
+        return type_psets[self.element_types]
+
+    def missing_common_pset(self):
+        """Indices of physical elements without their Pset_<Type>Common"""
+        return np.flatnonzero(self.element_physical & ~self.has_pset(self.common_pset_ids()))
+
+    def coverage_by_type(self, physical_only=True):
+        """Share of elements of each type that carry their Pset_<Type>Common"""
+        has_common = self.has_pset(self.common_pset_ids())
+        counted = self.element_physical if physical_only else np.ones(self.element_count, dtype=bool)
+        types = self.element_types[counted]
+        totals = np.bincount(types, minlength=len(self.element_type_pool))
+        covered = np.bincount(types, weights=has_common[counted], minlength=len(self.element_type_pool))
+
+        return {
+            self.element_type_pool[i]: {
+                'elements': int(totals[i]),
+                'covered': int(covered[i]),
+                'coverage': round(float(covered[i] / totals[i]), 4)
+            }
+            for i in np.flatnonzero(totals)
+        }
+
+    def fingerprint(self):
+        """
+        Hash of everything rule outcomes depend on: the element types and the
+        property rows with their pools, not the GlobalIds. A re-uploaded model,
+        or a copy with regenerated GlobalIds, fingerprints the same.
+        """
+        digest = hashlib.sha256()
+        for pool in (self.element_type_pool, self.pset_pool, self.property_pool, self.value_pool):
+            text = '\0'.join(pool.values).encode('utf-8')
+            digest.update(len(text).to_bytes(8, 'little'))
+            digest.update(text)
+        for column in (self.element_types, self.row_element, self.row_pset, self.row_property,
+                       self.row_value, self.row_number):
+            column = np.ascontiguousarray(column)
+            digest.update(column.nbytes.to_bytes(8, 'little'))
+            digest.update(column)
+        return digest.hexdigest()
+
+    def save(self, path):
+        """Write the table to a compressed .npz file"""
+        np.savez_compressed(
+            path,
+            element_guids=np.array(self.element_guids, dtype=str),
+            element_types=self.element_types,
+            element_physical=self.element_physical,
+            element_type_pool=np.array(self.element_type_pool.values, dtype=str),
+            pset_pool=np.array(self.pset_pool.values, dtype=str),
+            property_pool=np.array(self.property_pool.values, dtype=str),
+            value_pool=np.array(self.value_pool.values, dtype=str),
+            row_element=self.row_element,
+            row_pset=self.row_pset,
+            row_property=self.row_property,
+            row_value=self.row_value,
+            row_number=self.row_number
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                element_guids=data['element_guids'].tolist(),
+                element_types=data['element_types'],
+                element_physical=data['element_physical'],
+                element_type_pool=StringPool(data['element_type_pool'].tolist()),
+                pset_pool=StringPool(data['pset_pool'].tolist()),
+                property_pool=StringPool(data['property_pool'].tolist()),
+                value_pool=StringPool(data['value_pool'].tolist()),
+                row_element=data['row_element'],
+                row_pset=data['row_pset'],
+                row_property=data['row_property'],
+                row_value=data['row_value'],
+                row_number=data['row_number']
+            )
+
+class PropertyExtractor:
+    """Builds a PropertyTable from an ifcopenshell model"""
+
+    def extract(self, model):
+        element_index = {}
+        element_guids = []
+        element_types = array('i')
+        element_physical = array('b')
+        element_type_pool = StringPool()
+        pset_pool = StringPool()
+        property_pool = StringPool()
+        value_pool = StringPool()
+        row_element, row_pset, row_property, row_value = array('i'), array('i'), array('i'), array('i')
+        row_number = array('d')
+
+        for element in model.by_type('IfcProduct'):
+            element_index[element.id()] = len(element_guids)
+            element_guids.append(element.GlobalId)
+            element_types.append(element_type_pool.intern(element.is_a()))
+            element_physical.append(is_physical(element))
+
+        def add_pset(pset, elements):
+            if not pset.is_a('IfcPropertySet'):
+                return  # quantities and predefined sets are not property rows
+
+            pset_id = pset_pool.intern(pset.Name or '')
+            values = [self._property_value(prop) for prop in pset.HasProperties or ()]
+            values = [(property_pool.intern(name), value_pool.intern(text), number)
+                      for name, text, number in values if name is not None]
+
+            for element in elements:
+                index = element_index.get(element.id())
+                if index is None:
+                    continue
+                for property_id, value_id, number in values:
+                    row_element.append(index)
+                    row_pset.append(pset_id)
+                    row_property.append(property_id)
+                    row_value.append(value_id)
+                    row_number.append(number)
+
+        # Sets defined on a type object apply to every occurrence of that type;
+        # they are added first so the occurrence's own sets override them
+        for rel in model.by_type('IfcRelDefinesByType'):
+            for pset in rel.RelatingType.HasPropertySets or ():
+                add_pset(pset, rel.RelatedObjects)
+
+        for rel in model.by_type('IfcRelDefinesByProperties'):
+            add_pset(rel.RelatingPropertyDefinition, rel.RelatedObjects)
+
+        row_element = np.frombuffer(row_element, dtype=np.int32)
+        row_pset = np.frombuffer(row_pset, dtype=np.int32)
+        row_property = np.frombuffer(row_property, dtype=np.int32)
+        kept = self._last_rows(row_element, row_pset, row_property)
+
+        return PropertyTable(
+            element_guids=element_guids,
+            element_types=np.frombuffer(element_types, dtype=np.int32),
+            element_physical=np.frombuffer(element_physical, dtype=bool),
+            element_type_pool=element_type_pool,
+            pset_pool=pset_pool,
+            property_pool=property_pool,
+            value_pool=value_pool,
+            row_element=row_element[kept],
+            row_pset=row_pset[kept],
+            row_property=row_property[kept],
+            row_value=np.frombuffer(row_value, dtype=np.int32)[kept],
+            row_number=np.frombuffer(row_number, dtype=np.float64)[kept]
+        )
+
+    def _last_rows(self, row_element, row_pset, row_property):
+        """Indices of the last row of each (element, pset, property), in row order"""
+        order = np.lexsort((row_property, row_pset, row_element))  # stable: ties keep row order
+        last = np.ones(len(order), dtype=bool)
+        if len(order) > 1:
+            same = (np.diff(row_element[order]) == 0) & (np.diff(row_pset[order]) == 0) & \
+                   (np.diff(row_property[order]) == 0)
+            last[:-1] = ~same
+        return np.sort(order[last])
+
+    def _property_value(self, prop):
+        """Return (name, value as text, value as number) of a single-value property"""
+        if not prop.is_a('IfcPropertySingleValue'):
+            return None, None, None
+
+        value = prop.NominalValue.wrappedValue if prop.NominalValue else None
+        if isinstance(value, (bool, int, float)):
+            number = float(value)
+        else:
+            number = float('nan')
+
+        return prop.Name, '' if value is None else str(value), number
@@ -0,0 +1,159 @@
+"""
+Persistent rule outcomes per model content
+
+Outcomes are keyed by (rule set version, table fingerprint): the rule set
+version hashes the versions of the rules evaluated together (see
+rule_engine.rule_version) and the fingerprint covers every element type and
+property row of a model (PropertyTable.fingerprint), so re-validating a model
+that was seen before, such as a re-upload or a copy with new GlobalIds, is one
+lookup instead of an evaluation. Each entry holds the whole rule set's results
+for the model: the elements checked and the failing element indices per rule.
+
+The store lives in its own SQLite file shared by every worker process. It is
+bounded to max_entries models, evicting the least recently used (results of
+replaced rule sets are never used again, so they go first).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_outcomes (
+    rule_set TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    outcomes BLOB NOT NULL,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (rule_set, fingerprint)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS model_outcomes_last_used ON model_outcomes (last_used);
+
+-- Number of model_outcomes rows, maintained by store() rather than counted
+CREATE TABLE IF NOT EXISTS memo_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO memo_state (id, entries) VALUES (0, 0);
+"""
+
+TOUCH_INTERVAL = 3600  # seconds; recency is refreshed at most this often per entry
+EVICT_TO = 0.9  # share of max_entries kept after an eviction
+
+# How a rule's failing elements are packed
+INDICES, BITMASK = 0, 1
+BITMASK_RATIO = 4  # a bitmask is used once indices would be this many times larger
+
+def pack_outcomes(element_count, outcomes):
+    """
+    Pack [(checked, failing indices)] of every rule into one blob; each rule's
+    failing elements are kept as indices, or as a bitmask once that is several
+    times smaller (indices unpack much faster than a bitmask)
+    """
+    header = [len(outcomes), element_count]
+    parts = []
+    for checked, indices in outcomes:
+        indices = np.asarray(indices, dtype=np.int32)
+        if indices.nbytes <= BITMASK_RATIO * ((element_count + 7) // 8):
+            part, kind = indices.tobytes(), INDICES
+        else:
+            mask = np.zeros(element_count, dtype=bool)
+            mask[indices] = True
+            part, kind = np.packbits(mask).tobytes(), BITMASK
+        header += [checked, kind, len(part)]
+        parts.append(part)
+    return np.array(header, dtype=np.int64).tobytes() + b''.join(parts)
+
+def unpack_outcomes(blob):
+    rules, element_count = np.frombuffer(blob, dtype=np.int64, count=2).tolist()
+    header = np.frombuffer(blob, dtype=np.int64, count=2 + 3 * rules)[2:].reshape(rules, 3).tolist()
+    offset = (2 + 3 * rules) * 8
+    outcomes = []
+    for checked, kind, size in header:
+        if kind == INDICES:
+            indices = np.frombuffer(blob, dtype=np.int32, count=size // 4, offset=offset).astype(np.int64)
+        else:
+            bits = np.frombuffer(blob, dtype=np.uint8, count=size, offset=offset)
+            indices = np.flatnonzero(np.unpackbits(bits, count=element_count).view(bool))
+        outcomes.append((checked, indices))
+        offset += size
+    return outcomes
+
+class ResultMemo:
+    def __init__(self, path='result_memo.db', max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Connection of the current thread and process (sqlite3 connections can't
+        be shared between threads, nor used on both sides of a fork); each new
+        connection makes sure the schema exists
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.pid = os.getpid()
+            self._local.connection = None
+
+        connection = self._local.connection
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, uri=self.path.startswith('file:'))
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def lookup(self, rule_set, fingerprint):
+        """Memoized [(checked, failing indices)] of every rule, or None"""
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT outcomes, last_used FROM model_outcomes WHERE rule_set = ? AND fingerprint = ?',
+            (rule_set, fingerprint)
+        ).fetchone()
+        if row is None:
+            return None
+
+        blob, last_used = row
+        now = int(time.time())
+        if last_used < now - TOUCH_INTERVAL:
+            with connection:
+                connection.execute(
+                    'UPDATE model_outcomes SET last_used = ? WHERE rule_set = ? AND fingerprint = ?',
+                    (now, rule_set, fingerprint)
+                )
+        return unpack_outcomes(blob)
+
+    def store(self, rule_set, fingerprint, element_count, outcomes):
+        """Memoize a model's [(checked, failing indices)], evicting the oldest entries when full"""
+        blob = pack_outcomes(element_count, outcomes)
+        connection = self._connection()
+
+        with connection:
+            before = connection.total_changes
+            connection.execute(
+                'INSERT OR IGNORE INTO model_outcomes (rule_set, fingerprint, outcomes, last_used) '
+                'VALUES (?, ?, ?, ?)',
+                (rule_set, fingerprint, blob, int(time.time()))
+            )
+            self._count(connection, connection.total_changes - before)
+
+            entries = connection.execute('SELECT entries FROM memo_state').fetchone()[0]
+            if entries > self.max_entries:
+                before = connection.total_changes
+                connection.execute(
+                    'DELETE FROM model_outcomes WHERE (rule_set, fingerprint) IN '
+                    '(SELECT rule_set, fingerprint FROM model_outcomes ORDER BY last_used LIMIT ?)',
+                    (entries - int(self.max_entries * EVICT_TO),)
+                )
+                self._count(connection, before - connection.total_changes)
+
+    def _count(self, connection, added):
+        connection.execute('UPDATE memo_state SET entries = entries + ?', (added,))
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute('DELETE FROM model_outcomes')
+            connection.execute('UPDATE memo_state SET entries = 0')
@@ -0,0 +1,338 @@
+"""
+Declarative validation rules compiled to array predicates
+
+A rule selects elements by IFC type and checks their properties:
+
+    {
+        "name": "Fire Rating Requirements",
+        "description": "Doors and walls need a fire rating",
+        "severity": "critical",
+        "entity": ["IfcDoor", "IfcWall*"],
+        "when": [{"pset": "Pset_WallCommon", "property": "IsExternal", "op": "equals", "value": false}],
+        "require": [{"pset": "Pset_*Common", "property": "FireRating", "op": "exists"}]
+    }
+
+Elements of a matching type for which every "when" predicate holds must satisfy
+every "require" predicate; each one that does not is an issue. Type and pset
+names accept shell-style wildcards. Operators: exists, missing, equals,
+not_equals, in, not_in, matches (regular expression), gt, ge, lt, le.
+
+A rule set is compiled once (cached by its hash) and evaluated against a
+PropertyTable in a single pass over the property rows: rows are bucketed by the
+(pset, property) columns the rules mention, and each distinct predicate is then
+an array operation over its bucket, shared by every rule that uses it.
+
+With a result memo (services/result_memo.py) the results of a large enough rule
+set are looked up by the table's fingerprint first, keyed by the versions of
+its rules, so a model seen before is not evaluated again.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict, namedtuple
+from fnmatch import fnmatchcase
+
+import numpy as np
+
+SEVERITIES = ('critical', 'warning', 'info')
+PRESENCE_OPS = ('exists', 'missing')
+VALUE_OPS = ('equals', 'not_equals', 'in', 'not_in', 'matches')
+NUMERIC_OPS = {'gt': np.greater, 'ge': np.greater_equal, 'lt': np.less, 'le': np.less_equal}
+DENSE_KEY_SPACE = 1 << 22  # (pset, property) keys below which rows are bucketed through a lookup table
+ENGINE_VERSION = 1  # bump when evaluation semantics change, so memoized outcomes are not reused
+MEMO_MIN_PREDICATES = 64  # below this, evaluating is cheaper than fingerprinting the table
+
+Predicate = namedtuple('Predicate', ['pset', 'property', 'op', 'value'])
+CompiledRule = namedtuple('CompiledRule', ['name', 'version', 'description', 'category', 'severity',
+                                           'enabled', 'entity', 'when', 'require'])
+
+class RuleError(Exception):
+    pass
+
+def rule_set_hash(rules):
+    """Stable hash of a rule set's definitions"""
+    canonical = json.dumps(rules, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def rule_version(rule):
+    """Version of a single rule definition; changes whenever the rule (or the engine) does"""
+    return rule_set_hash({'engine': ENGINE_VERSION, 'rule': rule})
+
+class CompiledRuleSet:
+    def __init__(self, rules):
+        self.rules = rules
+        self.columns = sorted({(p.pset, p.property) for rule in rules for p in rule.when + rule.require})
+
+    def evaluate(self, table, names=None, memo=None):
+        """
+        Evaluate the rules (or just those named) against a PropertyTable
+
+        Returns one dict per rule with the number of elements checked, the number
+        failing and the indices of the failing elements. With a memo, the
+        results for a model whose content was seen before are reused.
+        """
+        rules = [rule for rule in self.rules if names is None or rule.name in names]
+        if memo is not None:
+            return self._evaluate_memoized(table, rules, memo)
+        return self._evaluate(table, rules)
+
+    def _evaluate(self, table, rules):
+        return [
+            self._result(rule, int(np.count_nonzero(applicable)), failing)
+            for rule, applicable, failing in self._rule_masks(table, rules)
+        ]
+
+    def _result(self, rule, checked, failing):
+        failing_count = int(np.count_nonzero(failing))
+        return {
+            'rule': rule,
+            'checked': checked,
+            'failing': failing_count,
+            'failing_indices': np.flatnonzero(failing) if failing_count else np.zeros(0, dtype=np.int64)
+        }
+
+    def _rule_masks(self, table, rules):
+        """(rule, applicable mask, failing mask) of each rule"""
+        buckets = self._bucket_rows(table)
+        value_groups = {}
+        masks = {}
+        entity_masks = {}
+
+        def mask(predicate):
+            if predicate not in masks:
+                masks[predicate] = self._predicate_mask(table, predicate, buckets, value_groups)
+            return masks[predicate]
+
+        def entity_mask(entity):
+            if entity not in entity_masks:
+                entity_masks[entity] = self._entity_mask(table, entity)
+            return entity_masks[entity]
+
+        for rule in rules:
+            applicable = entity_mask(rule.entity).copy()
+            for predicate in rule.when:
+                applicable &= mask(predicate)
+
+            passing = np.ones(table.element_count, dtype=bool)
+            for predicate in rule.require:
+                passing &= mask(predicate)
+
+            yield rule, applicable, applicable & ~passing
+
+    def _evaluate_memoized(self, table, rules, memo):
+        """
+        Results for the table's content from the memo, or evaluated and stored
+
+        Only worth it when evaluating costs more than fingerprinting the table,
+        i.e. for rule sets with enough distinct predicates.
+        """
+        predicates = {p for rule in rules for p in rule.when + rule.require}
+        if len(predicates) < MEMO_MIN_PREDICATES:
+            return self._evaluate(table, rules)
+
+        rule_set = rule_set_hash([rule.version for rule in rules])
+        fingerprint = table.fingerprint()
+        memoized = memo.lookup(rule_set, fingerprint)
+        if memoized is not None:
+            return [
+                {'rule': rule, 'checked': checked, 'failing': len(indices), 'failing_indices': indices}
+                for rule, (checked, indices) in zip(rules, memoized)
+            ]
+
+        results = self._evaluate(table, rules)
+        memo.store(rule_set, fingerprint, table.element_count,
+                   [(result['checked'], result['failing_indices']) for result in results])
+        return results
+
+    def _bucket_rows(self, table):
+        """Property rows of each column, found in one pass over the table"""
+        property_count = max(1, len(table.property_pool))
+        row_keys = table.row_pset.astype(np.int64) * property_count + table.row_property
+
+        # A (pset, property) pair can match several wildcard columns; one pass per layer
+        layers = []
+        for column, (pset_glob, property_name) in enumerate(self.columns):
+            property_id = table.property_pool.get(property_name)
+            if property_id < 0:
+                continue
+            for pset_id, pset_name in enumerate(table.pset_pool.values):
+                if fnmatchcase(pset_name, pset_glob):
+                    key = pset_id * property_count + property_id
+                    layer = next((layer for layer in layers if key not in layer), None)
+                    if layer is None:
+                        layer = {}
+                        layers.append(layer)
+                    layer[key] = column
+
+        key_space = len(table.pset_pool) * property_count
+        pair_rows, pair_columns = [], []
+        for layer in layers:
+            if key_space <= max(len(row_keys), DENSE_KEY_SPACE):
+                # Direct lookup table over every (pset, property) key
+                lookup = np.full(key_space, -1, dtype=np.int32)
+                lookup[list(layer)] = list(layer.values())
+                row_columns = lookup[row_keys]
+                hits = np.flatnonzero(row_columns >= 0)
+                pair_rows.append(hits)
+                pair_columns.append(row_columns[hits])
+            else:
+                keys = np.array(sorted(layer), dtype=np.int64)
+                columns = np.array([layer[key] for key in keys], dtype=np.int32)
+                positions = np.searchsorted(keys, row_keys).clip(max=len(keys) - 1)
+                hits = np.flatnonzero(keys[positions] == row_keys)
+                pair_rows.append(hits)
+                pair_columns.append(columns[positions[hits]])
+
+        if pair_rows:
+            rows = np.concatenate(pair_rows)
+            columns = np.concatenate(pair_columns)
+        else:
+            rows = columns = np.zeros(0, dtype=np.int64)
+
+        order = np.argsort(columns, kind='stable')
+        rows = rows[order]
+        offsets = np.zeros(len(self.columns) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=len(self.columns)), out=offsets[1:])
+
+        return {
+            column: rows[offsets[i]:offsets[i + 1]]
+            for i, column in enumerate(self.columns)
+        }
+
+    def _entity_mask(self, table, entity_globs):
+        type_matches = np.array([
+            any(fnmatchcase(type_name, glob) for glob in entity_globs)
+            for type_name in table.element_type_pool.values
+        ], dtype=bool)
+        if not len(type_matches):
+            return np.zeros(table.element_count, dtype=bool)
+        return type_matches[table.element_types]
+
+    def _value_groups(self, table, column, rows, value_groups):
+        """Distinct value ids of a column's rows, and each row's index into them (cached per column)"""
+        if column not in value_groups:
+            value_groups[column] = np.unique(table.row_value[rows], return_inverse=True)
+        return value_groups[column]
+
+    def _predicate_mask(self, table, predicate, buckets, value_groups):
+        """Elements for which a predicate holds"""
+        column = (predicate.pset, predicate.property)
+        rows = buckets[column]
+        elements = table.row_element[rows]
+        result = np.zeros(table.element_count, dtype=bool)
+
+        if predicate.op in PRESENCE_OPS:
+            result[elements] = True
+            return ~result if predicate.op == 'missing' else result
+
+        if predicate.op in NUMERIC_OPS:
+            with np.errstate(invalid='ignore'):
+                holds = NUMERIC_OPS[predicate.op](table.row_number[rows], predicate.value)
+        else:
+            # Evaluate once per distinct value in the column's rows, then map rows back
+            distinct, inverse = self._value_groups(table, column, rows, value_groups)
+            values = table.value_pool.values
+            lookup = np.array([self._value_holds(predicate, values[v]) for v in distinct.tolist()], dtype=bool)
+            holds = lookup[inverse] if len(lookup) else np.zeros(len(rows), dtype=bool)
+
+        result[elements[holds]] = True
+        return result
+
+    def _value_holds(self, predicate, value):
+        if predicate.op == 'equals':
+            return value == predicate.value
+        if predicate.op == 'not_equals':
+            return value != predicate.value
+        if predicate.op == 'in':
+            return value in predicate.value
+        if predicate.op == 'not_in':
+            return value not in predicate.value
+        return predicate.value.fullmatch(value) is not None
+
+class RuleCompiler:
+    """Compiles rule definitions, caching compiled sets by rule-set hash"""
+
+    def __init__(self, cache_size=32):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, rules):
+        key = rule_set_hash(rules)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        compiled = CompiledRuleSet([self._compile_rule(rule) for rule in rules])
+
+        with self._lock:
+            self._cache[key] = compiled
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compiled
+
+    def _compile_rule(self, rule):
+        name = rule.get('name')
+        if not name:
+            raise RuleError('Every rule needs a name')
+
+        severity = rule.get('severity', 'warning')
+        if severity not in SEVERITIES:
+            raise RuleError(f"Rule '{name}': severity must be one of {', '.join(SEVERITIES)}")
+
+        entity = rule.get('entity')
+        if isinstance(entity, str):
+            entity = [entity]
+        if not entity:
+            raise RuleError(f"Rule '{name}': entity is required")
+
+        require = tuple(self._compile_predicate(name, p) for p in rule.get('require', []))
+        if not require:
+            raise RuleError(f"Rule '{name}': at least one require predicate is needed")
+
+        return CompiledRule(
+            name=name,
+            version=rule_version(rule),
+            description=rule.get('description', ''),
+            category=rule.get('category', 'Properties'),
+            severity=severity,
+            enabled=rule.get('enabled', True),
+            entity=tuple(entity),
+            when=tuple(self._compile_predicate(name, p) for p in rule.get('when', [])),
+            require=require
+        )
+
+    def _compile_predicate(self, rule_name, predicate):
+        try:
+            pset, property_name, op = predicate['pset'], predicate['property'], predicate['op']
+        except (KeyError, TypeError):
+            raise RuleError(f"Rule '{rule_name}': predicates need pset, property and op")
+
+        value = predicate.get('value')
+        if op in PRESENCE_OPS:
+            value = None
+        elif op in NUMERIC_OPS:
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise RuleError(f"Rule '{rule_name}': {op} needs a numeric value")
+            value = float(value)
+        elif op in ('equals', 'not_equals'):
+            value = self._as_text(value)
+        elif op in ('in', 'not_in'):
+            if not isinstance(value, list):
+                raise RuleError(f"Rule '{rule_name}': {op} needs a list value")
+            value = frozenset(self._as_text(v) for v in value)
+        elif op == 'matches':
+            try:
+                value = re.compile(value)
+            except (re.error, TypeError):
+                raise RuleError(f"Rule '{rule_name}': matches needs a valid regular expression")
+        else:
+            raise RuleError(f"Rule '{rule_name}': unknown operator '{op}'")
+
+        return Predicate(pset, property_name, op, value)
+
+    def _as_text(self, value):
+        """Property values are compared in the text form the extractor stores"""
+        return '' if value is None else str(value)
@@ -0,0 +1,330 @@
+"""
+Cross-project search index
+
+A separate SQLite database holding every indexed project's elements (GlobalId
+and IFC type), their property values and their issues. Secondary indexes cover
+the exact filters (type, GlobalId, severity, rule, property name) and FTS5
+tables cover free text over issues and distinct property values, so queries
+such as "every IfcDoor missing FireRating" are index lookups rather than
+per-project scans. Each node serving search keeps its own index: projects are
+indexed as the validation pipeline stores their results in the web process,
+and those processed elsewhere (worker nodes) are caught up in the background,
+from the watermark of the last project completion already seen.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    project_id TEXT PRIMARY KEY,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS elements (
+    id INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    guid TEXT NOT NULL,
+    ifc_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS elements_type ON elements (ifc_type, project_id);
+CREATE INDEX IF NOT EXISTS elements_guid ON elements (guid);
+CREATE INDEX IF NOT EXISTS elements_project ON elements (project_id);
+
+-- Property values are interned: one row (and one FTS entry) per distinct value
+CREATE TABLE IF NOT EXISTS property_values (
+    id INTEGER PRIMARY KEY,
+    value TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS property_values_fts USING fts5(
+    value, content='property_values', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS property_values_ai AFTER INSERT ON property_values BEGIN
+    INSERT INTO property_values_fts (rowid, value) VALUES (new.id, new.value);
+END;
+
+CREATE TABLE IF NOT EXISTS properties (
+    element_id INTEGER NOT NULL,
+    pset TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS properties_element ON properties (element_id, name);
+CREATE INDEX IF NOT EXISTS properties_name_value ON properties (name, value_id);
+
+CREATE TABLE IF NOT EXISTS issues (
+    id INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    rule_name TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    guid TEXT,
+    element_type TEXT,
+    description TEXT
+);
+CREATE INDEX IF NOT EXISTS issues_project ON issues (project_id);
+CREATE INDEX IF NOT EXISTS issues_type ON issues (element_type, severity);
+CREATE INDEX IF NOT EXISTS issues_rule ON issues (rule_name);
+CREATE INDEX IF NOT EXISTS issues_guid ON issues (guid);
+CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5(
+    rule_name, description, element_type, content='issues', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS issues_ai AFTER INSERT ON issues BEGIN
+    INSERT INTO issues_fts (rowid, rule_name, description, element_type)
+    VALUES (new.id, new.rule_name, new.description, new.element_type);
+END;
+CREATE TRIGGER IF NOT EXISTS issues_ad AFTER DELETE ON issues BEGIN
+    INSERT INTO issues_fts (issues_fts, rowid, rule_name, description, element_type)
+    VALUES ('delete', old.id, old.rule_name, old.description, old.element_type);
+END;
+
+-- Last project completion this index was caught up to (see app.sync_search_index)
+CREATE TABLE IF NOT EXISTS sync_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    completion_id INTEGER NOT NULL
+);
+"""
+
+# target: (table alias and FROM clause, result columns, facet columns)
+TARGETS = {
+    'issues': (
+        'issues x',
+        ['project_id', 'rule_name', 'severity', 'guid', 'element_type', 'description'],
+        ['severity', 'element_type', 'rule_name', 'project_id']
+    ),
+    'elements': (
+        'elements x',
+        ['project_id', 'guid', 'ifc_type'],
+        ['ifc_type', 'project_id']
+    )
+}
+
+FACET_LIMIT = 20
+MAX_LIMIT = 500
+VALUE_LOOKUP_CHUNK = 500
+
+class SearchIndex:
+    def __init__(self, path='search_index.db'):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Connection of the current thread and process (sqlite3 connections can't
+        be shared between threads, nor used on both sides of a fork); each new
+        connection makes sure the schema exists
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.pid = os.getpid()
+            self._local.connection = None
+
+        connection = self._local.connection
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, uri=self.path.startswith('file:'))
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            with connection:
+                connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def index_project(self, project_id, name, validation_results, property_table=None):
+        """(Re)index one project's issues and, when given, its elements and properties"""
+        with self._connection() as connection:
+            self._delete_project(connection, project_id)
+            connection.execute('INSERT INTO projects (project_id, name) VALUES (?, ?)', (project_id, name))
+
+            connection.executemany(
+                'INSERT INTO issues (project_id, rule_name, severity, guid, element_type, description) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (project_id, result['name'], result['severity'], guid, element_type,
+                     result.get('description', ''))
+                    for result in validation_results
+                    for guid, element_type in result.get('elements', [])
+                )
+            )
+
+            if property_table is not None:
+                self._index_properties(connection, project_id, property_table)
+
+    def has_project(self, project_id):
+        return self._connection().execute(
+            'SELECT 1 FROM projects WHERE project_id = ?', (project_id,)
+        ).fetchone() is not None
+
+    def remove_project(self, project_id):
+        with self._connection() as connection:
+            self._delete_project(connection, project_id)
+
+    def watermark(self):
+        """Last project completion caught up to, or None for an index never synced"""
+        row = self._connection().execute('SELECT completion_id FROM sync_state').fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, completion_id):
+        with self._connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO sync_state (id, completion_id) VALUES (0, ?)',
+                               (completion_id,))
+
+    @contextmanager
+    def sync_lock(self):
+        """
+        Whether this process gets to sync the index: one process of a node at a
+        time, the others skip their turn rather than wait (an in-memory index
+        belongs to a single process)
+        """
+        if fcntl is None or self.path.startswith('file:') or self.path == ':memory:':
+            yield True
+            return
+
+        with open(self.path + '.sync.lock', 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            yield True
+
+    def _delete_project(self, connection, project_id):
+        connection.execute(
+            'DELETE FROM properties WHERE element_id IN (SELECT id FROM elements WHERE project_id = ?)',
+            (project_id,)
+        )
+        connection.execute('DELETE FROM elements WHERE project_id = ?', (project_id,))
+        connection.execute('DELETE FROM issues WHERE project_id = ?', (project_id,))
+        connection.execute('DELETE FROM projects WHERE project_id = ?', (project_id,))
+
+    def _index_properties(self, connection, project_id, table):
+        # Element ids are assigned here so property rows can refer to them
+        # without reading them back; the transaction holds the write lock
+        first_id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM elements').fetchone()[0]
+        type_names = table.element_type_pool.values
+        connection.executemany(
+            'INSERT INTO elements (id, project_id, guid, ifc_type) VALUES (?, ?, ?, ?)',
+            (
+                (first_id + i, project_id, guid, type_names[type_id])
+                for i, (guid, type_id) in enumerate(zip(table.element_guids, table.element_types.tolist()))
+            )
+        )
+
+        values = table.value_pool.values
+        connection.executemany('INSERT OR IGNORE INTO property_values (value) VALUES (?)',
+                               ((value,) for value in values))
+        value_ids = {}
+        for start in range(0, len(values), VALUE_LOOKUP_CHUNK):
+            chunk = values[start:start + VALUE_LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            value_ids.update(
+                (value, value_id) for value_id, value in
+                connection.execute(f'SELECT id, value FROM property_values WHERE value IN ({placeholders})', chunk)
+            )
+        pool_to_db = np.array([value_ids[value] for value in values], dtype=np.int64)
+
+        pset_names = table.pset_pool.values
+        property_names = table.property_pool.values
+        connection.executemany(
+            'INSERT INTO properties (element_id, pset, name, value_id) VALUES (?, ?, ?, ?)',
+            (
+                (element_id, pset_names[pset_id], property_names[property_id], value_id)
+                for element_id, pset_id, property_id, value_id in zip(
+                    (table.row_element.astype(np.int64) + first_id).tolist(),
+                    table.row_pset.tolist(),
+                    table.row_property.tolist(),
+                    pool_to_db[table.row_value].tolist() if len(pool_to_db) else []
+                )
+            )
+        )
+
+    def search(self, target='issues', q=None, project_id=None, element_type=None, guid=None,
+               severity=None, rule_name=None, missing=None, has=None, property_value=None,
+               limit=50, offset=0):
+        """
+        Search issues or elements across all projects
+
+        Issues filter on q (full text over rule, description and type),
+        project_id, element_type, guid, severity and rule_name. Elements filter
+        on q (full text over property values), project_id, element_type, guid,
+        missing / has (a property name the element lacks / carries) and
+        property_value ((name, value) it must carry). Returns the matching page,
+        the total and facet counts.
+        """
+        if target not in TARGETS:
+            raise ValueError(f"target must be one of {', '.join(TARGETS)}")
+
+        source, columns, facets = TARGETS[target]
+        where, params = [], []
+
+        def add(clause, *values):
+            where.append(clause)
+            params.extend(values)
+
+        if project_id:
+            add('x.project_id = ?', project_id)
+        if guid:
+            add('x.guid = ?', guid)
+
+        if target == 'issues':
+            if q:
+                add('x.id IN (SELECT rowid FROM issues_fts WHERE issues_fts MATCH ?)', q)
+            if element_type:
+                add('x.element_type = ?', element_type)
+            if severity:
+                add('x.severity = ?', severity)
+            if rule_name:
+                add('x.rule_name = ?', rule_name)
+        else:
+            if element_type:
+                add('x.ifc_type = ?', element_type)
+            if missing:
+                add('NOT EXISTS (SELECT 1 FROM properties p WHERE p.element_id = x.id AND p.name = ?)', missing)
+            if has:
+                add('EXISTS (SELECT 1 FROM properties p WHERE p.element_id = x.id AND p.name = ?)', has)
+            if property_value:
+                add('EXISTS (SELECT 1 FROM properties p WHERE p.element_id = x.id AND p.name = ? AND '
+                    'p.value_id = (SELECT id FROM property_values WHERE value = ?))', *property_value)
+            if q:
+                add('EXISTS (SELECT 1 FROM properties p WHERE p.element_id = x.id AND p.value_id IN '
+                    '(SELECT rowid FROM property_values_fts WHERE property_values_fts MATCH ?))', q)
+
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ''
+        limit = max(1, min(MAX_LIMIT, limit))
+        connection = self._connection()
+
+        try:
+            total = connection.execute(f'SELECT COUNT(*) FROM {source} {where_sql}', params).fetchone()[0]
+
+            rows = connection.execute(
+                f"SELECT {', '.join('x.' + c for c in columns)}, pr.name FROM {source} "
+                f"LEFT JOIN projects pr ON pr.project_id = x.project_id {where_sql} "
+                f"LIMIT ? OFFSET ?",
+                params + [limit, max(0, offset)]
+            ).fetchall()
+
+            facet_counts = {}
+            for facet in facets:
+                facet_counts[facet] = [
+                    {'value': value, 'count': count}
+                    for value, count in connection.execute(
+                        f'SELECT x.{facet}, COUNT(*) AS n FROM {source} {where_sql} '
+                        f'GROUP BY x.{facet} ORDER BY n DESC LIMIT {FACET_LIMIT}',
+                        params
+                    )
+                ]
+        except sqlite3.OperationalError as e:
+            # Malformed FTS5 query syntax
+            raise ValueError(f"Invalid search query: {e}")
+
+        return {
+            'target': target,
+            'total': total,
+            'results': [dict(zip(columns + ['project_name'], row)) for row in rows],
+            'facets': facet_counts
+        }
@@ -0,0 +1,199 @@
+from array import array
+
+import numpy as np
+
+from services.property_extractor import StringPool, is_physical
+
+SPATIAL_LEVELS = ['IfcProject', 'IfcSite', 'IfcBuilding', 'IfcBuildingStorey']
+
+class SpatialGraph:
+    """
+    Project -> Site -> Building -> Storey -> Element hierarchy as arrays
+
+    Every node (the project and each product) has an int32 parent index (-1 for
+    roots) and children are stored in CSR form: the children of node n are
+    child_index[child_offsets[n]:child_offsets[n + 1]]. Traversals go level by
+    level from the roots with array operations, so orphan detection and
+    per-storey counts are linear in the size of the model.
+    """
+
+    def __init__(self, node_guids, node_names, node_types, node_physical, type_pool, parent):
+        self.node_guids = node_guids
+        self.node_names = node_names
+        self.node_types = node_types
+        self.node_physical = node_physical
+        self.type_pool = type_pool
+        self.parent = parent
+
+        has_parent = np.flatnonzero(parent >= 0)
+        self.child_index = has_parent[np.argsort(parent[has_parent], kind='stable')].astype(np.int32)
+        self.child_offsets = np.zeros(len(parent) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(parent[has_parent], minlength=len(parent)), out=self.child_offsets[1:])
+
+        self._levels = None
+
+    @property
+    def node_count(self):
+        return len(self.parent)
+
+    def is_type(self, type_name):
+        """Boolean mask over nodes of exactly this IFC type"""
+        return self.node_types == self.type_pool.get(type_name)
+
+    def children(self, nodes):
+        """Children of all given nodes, concatenated"""
+        nodes = np.asarray(nodes)
+        starts = self.child_offsets[nodes]
+        counts = self.child_offsets[nodes + 1] - starts
+        if not counts.sum():
+            return np.zeros(0, dtype=np.int32)
+
+        # Gather every [start, start + count) range without a Python loop
+        shifts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return self.child_index[shifts + np.arange(counts.sum())]
+
+    def levels(self):
+        """Nodes grouped by depth, breadth first from the roots (cached)"""
+        if self._levels is None:
+            levels = []
+            frontier = np.flatnonzero(self.parent < 0)
+            while frontier.size:
+                levels.append(frontier)
+                frontier = self.children(frontier)
+            self._levels = levels
+        return self._levels
+
+    def propagate(self, seed):
+        """
+        Push a per-node value down the hierarchy
+
+        seed holds a value (>= 0) for nodes that set one and -1 elsewhere; every
+        node inherits the value of its nearest ancestor that sets one.
+        """
+        values = np.asarray(seed).copy()
+        for level in self.levels()[1:]:
+            unset = level[values[level] < 0]
+            values[unset] = values[self.parent[unset]]
+        return values
+
+    def orphans(self):
+        """Physical elements that are not placed under the project"""
+        under_project = self.propagate(np.where(self.is_type('IfcProject'), 1, -1)) > 0
+        return np.flatnonzero(self.node_physical & ~under_project)
+
+    def storey_of(self):
+        """Index of the nearest enclosing storey of every node (-1 when none)"""
+        storeys = self.is_type('IfcBuildingStorey')
+        return self.propagate(np.where(storeys, np.arange(self.node_count), -1))
+
+    def storey_counts(self):
+        """Number of physical elements on each storey, in hierarchy order"""
+        storey_of = self.storey_of()
+        counts = np.bincount(storey_of[self.node_physical & (storey_of >= 0)], minlength=self.node_count)
+
+        order = np.concatenate(self.levels()) if self.levels() else np.zeros(0, dtype=np.int64)
+        storeys = order[self.is_type('IfcBuildingStorey')[order]]
+        return [
+            {
+                'guid': self.node_guids[i],
+                'name': self.node_names[i],
+                'elements': int(counts[i])
+            }
+            for i in storeys
+        ]
+
+    def summary(self):
+        """Figures used by IFCProcessor, the Spatial Structure rule and statistics"""
+        orphans = self.orphans()
+        return {
+            'building_stories': int(self.is_type('IfcBuildingStorey').sum()),
+            'spaces': int(self.is_type('IfcSpace').sum()),
+            'orphan_elements': len(orphans),
+            'orphans': [(self.node_guids[i], self.type_pool[self.node_types[i]]) for i in orphans],
+            'missing_spatial_levels': [level for level in SPATIAL_LEVELS if not self.is_type(level).any()],
+            'storey_counts': self.storey_counts()
+        }
+
+    def save(self, path):
+        """Write the graph to a compressed .npz file"""
+        np.savez_compressed(
+            path,
+            node_guids=np.array(self.node_guids, dtype=str),
+            node_names=np.array(self.node_names, dtype=str),
+            node_types=self.node_types,
+            node_physical=self.node_physical,
+            type_pool=np.array(self.type_pool.values, dtype=str),
+            parent=self.parent
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                node_guids=data['node_guids'].tolist(),
+                node_names=data['node_names'].tolist(),
+                node_types=data['node_types'],
+                node_physical=data['node_physical'],
+                type_pool=StringPool(data['type_pool'].tolist()),
+                parent=data['parent']
+            )
+
+class SpatialGraphBuilder:
+    """Builds a SpatialGraph from an ifcopenshell model"""
+
+    def build(self, model):
+        node_index = {}
+        node_guids = []
+        node_names = []
+        node_types = array('i')
+        node_physical = array('b')
+        type_pool = StringPool()
+
+        for entity in model.by_type('IfcProject') + model.by_type('IfcProduct'):
+            node_index[entity.id()] = len(node_guids)
+            node_guids.append(entity.GlobalId)
+            node_names.append(entity.Name or '')
+            node_types.append(type_pool.intern(entity.is_a()))
+            node_physical.append(is_physical(entity))
+
+        parent = np.full(len(node_guids), -1, dtype=np.int32)
+
+        def link(relating, related):
+            parent_index = node_index.get(relating.id())
+            if parent_index is None:
+                return
+            for child in related:
+                child_index = node_index.get(child.id())
+                # An object has one decomposition or container; keep the first seen
+                if child_index is not None and parent[child_index] < 0 and child_index != parent_index:
+                    parent[child_index] = parent_index
+
+        for rel in model.by_type('IfcRelAggregates'):
+            link(rel.RelatingObject, rel.RelatedObjects)
+
+        for rel in model.by_type('IfcRelContainedInSpatialStructure'):
+            link(rel.RelatingStructure, rel.RelatedElements)
+
+        # Elements placed through another element: openings and projections
+        # hang off their host, nested components off their parent, and doors or
+        # windows that are only related to the opening they fill off that opening
+        for rel in model.by_type('IfcRelVoidsElement'):
+            link(rel.RelatingBuildingElement, [rel.RelatedOpeningElement])
+
+        for rel in model.by_type('IfcRelProjectsElement'):
+            link(rel.RelatingElement, [rel.RelatedFeatureElement])
+
+        for rel in model.by_type('IfcRelNests'):
+            link(rel.RelatingObject, rel.RelatedObjects)
+
+        for rel in model.by_type('IfcRelFillsElement'):
+            link(rel.RelatingOpeningElement, [rel.RelatedBuildingElement])
+
+        return SpatialGraph(
+            node_guids=node_guids,
+            node_names=node_names,
+            node_types=np.frombuffer(node_types, dtype=np.int32),
+            node_physical=np.frombuffer(node_physical, dtype=bool),
+            type_pool=type_pool,
+            parent=parent
+        )
@@ -1,8 +1,21 @@
+import json
+import os
 import random
 from datetime import datetime
 
+from services.result_memo import ResultMemo
+from services.rule_engine import RuleCompiler
+
+DEFAULT_CUSTOM_RULES = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'rules', 'custom_rules.json')
+
 class ValidationService:
-    def __init__(self):
+    def __init__(self, custom_rules_path=None, result_memo_path=None, result_memo_size=1000):
+        self.rule_compiler = RuleCompiler()
+        # Custom rule outcomes memoized per model content (off without a path)
+        self.result_memo = ResultMemo(result_memo_path, result_memo_size) if result_memo_path else None
+        with open(custom_rules_path or DEFAULT_CUSTOM_RULES) as f:
+            self.custom_rules = json.load(f)
+
         self.validation_rules = [
             {
                 'name': 'IFC Schema Validation',
@@ -65,17 +78,40 @@ class ValidationService:
             result = self._run_validation_rule(rule, ifc_results)
             validation_results.append(result)
 
+        # Enabled custom rules need the extracted property table
+        if ifc_results.get('property_table') is not None:
+            enabled = [rule['name'] for rule in self.custom_rules if rule.get('enabled', True)]
+            validation_results.extend(self.run_custom_rules(ifc_results, enabled))
+
         return validation_results
 
     def _run_validation_rule(self, rule, ifc_results):
         """Run a specific validation rule"""
         # Mock validation logic for demo
         rule_name = rule['name']
+        elements = []  # (GlobalId, IFC type) of offending elements, where known
 
         if rule_name == 'IFC Schema Validation':
             status = 'passed' if ifc_results.get('schema_valid', True) else 'critical'
             issues = 0 if status == 'passed' else random.randint(1, 5)
 
+        elif rule_name == 'Property Completeness' and 'property_coverage' in ifc_results:
+            # Elements missing their Pset_<Type>Common, from the extracted property table
+            by_type = ifc_results['property_coverage'].values()
+            checked = sum(c['elements'] for c in by_type)
+            covered = sum(c['covered'] for c in by_type)
+            coverage = covered / max(1, checked)
+            issues = checked - covered
+            if coverage > 0.9:
+                status = 'passed'
+            elif coverage > 0.8:
+                status = 'warning'
+            else:
+                status = 'critical'
+            if ifc_results.get('property_table') is not None:
+                property_table = ifc_results['property_table']
+                elements = property_table.describe_elements(property_table.missing_common_pset())
+
         elif rule_name == 'Property Completeness':
             coverage = random.uniform(0.7, 0.95)
             if coverage > 0.9:
@@ -100,6 +136,12 @@ class ValidationService:
                 status = 'critical'
                 issues = random.randint(1, min(20, total_elements // 100))
 
+        elif rule_name == 'Spatial Structure' and 'orphan_elements' in ifc_results:
+            # Missing hierarchy levels and elements outside it, from the spatial graph
+            issues = ifc_results['orphan_elements'] + len(ifc_results['missing_spatial_levels'])
+            status = 'passed' if issues == 0 else 'critical'
+            elements = ifc_results['orphans']
+
         elif rule_name == 'Data Integrity':
             status = random.choices(['passed', 'warning'], weights=[0.8, 0.2])[0]
             issues = 0 if status == 'passed' else random.randint(1, 10)
@@ -121,6 +163,7 @@ class ValidationService:
             'severity': rule['severity'],
             'status': status,
             'issues': issues,
+            'elements': elements,
             'timestamp': datetime.utcnow().isoformat()
         }
 
@@ -128,28 +171,44 @@ class ValidationService:
         """Return available custom validation rules"""
         return [
             {
-                'name': 'Fire Rating Requirements',
-                'description': 'Validates fire rating properties for safety compliance',
-                'enabled': True
-            },
-            {
-                'name': 'Accessibility Standards',
-                'description': 'Checks compliance with accessibility requirements',
-                'enabled': False
-            },
-            {
-                'name': 'Energy Performance',
-                'description': 'Validates energy-related properties and values',
-                'enabled': True
+                'name': rule['name'],
+                'description': rule.get('description', ''),
+                'enabled': rule.get('enabled', True),
+                'severity': rule.get('severity', 'warning')
             }
+            for rule in self.custom_rules
         ]
 
+    def run_custom_rules(self, ifc_results, rule_names=None):
+        """Run custom rules (all, or those named) in one pass over the property table"""
+        property_table = ifc_results.get('property_table')
+        if property_table is None:
+            raise Exception("Custom validation needs the extracted property table")
+
+        # Compiled once per distinct rule set, then served from the compiler's cache
+        compiled = self.rule_compiler.compile(self.custom_rules)
+        results = []
+
+        for outcome in compiled.evaluate(property_table, rule_names, memo=self.result_memo):
+            rule = outcome['rule']
+            results.append({
+                'name': rule.name,
+                'description': rule.description,
+                'category': rule.category,
+                'severity': rule.severity,
+                'status': 'passed' if outcome['failing'] == 0 else rule.severity,
+                'issues': outcome['failing'],
+                'details': f"{outcome['failing']} of {outcome['checked']} checked elements failed",
+                'elements': property_table.describe_elements(outcome['failing_indices']),
+                'timestamp': datetime.utcnow().isoformat()
+            })
+
+        return results
+
     def run_custom_validation(self, rule_name, ifc_results):
         """Run a custom validation rule"""
-        # Mock implementation for custom rules
-        return {
-            'name': rule_name,
-            'status': random.choice(['passed', 'warning', 'critical']),
-            'issues': random.randint(0, 20),
-            'details': f'Custom validation completed for {rule_name}'
-        }
+        results = self.run_custom_rules(ifc_results, [rule_name])
+        if not results:
+            raise Exception(f"Unknown custom rule: {rule_name}")
+
+        return results[0]
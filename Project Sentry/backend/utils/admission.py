@@ -0,0 +1,243 @@
+"""
+Admission control for uploads
+
+Every upload asks for a ticket before its body is read and holds it until it
+has been processed. A ticket is refused when the server is short of a shared
+resource (503: in-flight upload bytes, free disk in the upload folder,
+available memory, processing queue depth) or when the client already holds
+more than its fair share of the queue (429). Refusals carry a Retry-After
+estimated from recent processing times, so admitted work keeps a bounded
+latency instead of everything slowing down together.
+
+State is shared by every process of a node (gunicorn workers, the ASGI
+server) through a small JSON file in the upload folder, locked with flock
+around each change and replaced whole, so readers never see it half-written;
+tickets of processes that exited without releasing them are dropped on the
+next change. Disk and memory are per node, so each node
+admits independently.
+"""
+import json
+import math
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no flock, and no forking servers either; one process, one thread lock
+    fcntl = None
+
+DEFAULT_JOB_SECONDS = 5.0
+DURATION_SMOOTHING = 0.2  # weight of the newest job in the average processing time
+MAX_RETRY_AFTER = 300  # seconds
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def available_memory():
+    """Bytes of memory available to new work, or None when it can't be read"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class AdmissionTicket:
+    """Held by an admitted upload until it is processed; release() (or a with block) frees it"""
+
+    def __init__(self, controller, ticket_id, client, size):
+        self.controller = controller
+        self.id = ticket_id
+        self.client = client
+        self.size = size
+        self.weight = 1
+        self.started = time.monotonic()
+        self._released = False
+
+    def reweigh(self, weight):
+        """Count the ticket as weight uploads (e.g. a batch's models); may raise AdmissionRejected"""
+        self.controller._reweigh(self, weight)
+        self.weight = weight
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class AdmissionController:
+    def __init__(self, upload_folder, max_upload_size, max_inflight_bytes, max_queue,
+                 min_free_disk, min_free_memory, workers=1, state_path=None, backlog=None):
+        self.upload_folder = upload_folder
+        self.max_upload_size = max_upload_size
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_queue = max_queue
+        self.min_free_disk = min_free_disk
+        self.min_free_memory = min_free_memory
+        self.workers = max(1, workers)
+        self.state_path = state_path or os.path.join(upload_folder, '.admission.json')
+        # Callable counting work queued beyond this node's tickets (the processing
+        # jobs waiting for worker nodes), or None
+        self.backlog = backlog
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            upload_folder=config['UPLOAD_FOLDER'],
+            max_upload_size=config['MAX_CONTENT_LENGTH'],
+            max_inflight_bytes=config['ADMISSION_MAX_INFLIGHT_BYTES'],
+            max_queue=config['ADMISSION_MAX_QUEUE'],
+            min_free_disk=config['ADMISSION_MIN_FREE_DISK'],
+            min_free_memory=config['ADMISSION_MIN_FREE_MEMORY'],
+            workers=config['PROCESSING_WORKERS']
+        )
+
+    def _read_state(self):
+        """
+        The node's admission state as last written; a missing or unreadable file
+        (e.g. left half-written by a crash) counts as empty
+        """
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if not isinstance(state, dict):
+            state = {}
+        state.setdefault('tickets', {})
+        state.setdefault('job_seconds', DEFAULT_JOB_SECONDS)
+
+        if fcntl is not None:
+            state['tickets'] = {
+                ticket_id: ticket for ticket_id, ticket in state['tickets'].items()
+                if process_alive(ticket['pid'])
+            }
+        return state
+
+    @contextmanager
+    def _state(self):
+        """
+        The node's admission state, locked against other threads and processes
+        and written back when the block completes (not when it raises)
+        """
+        # The lock lives in its own file: the state file is replaced on every write
+        with self._lock, open(self.state_path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            state = self._read_state()
+
+            yield state
+
+            # Write then rename, so a crash never leaves a partial state behind
+            partial = self.state_path + '.part'
+            with open(partial, 'w') as f:
+                json.dump(state, f)
+            os.replace(partial, self.state_path)
+
+    def admit(self, client, size=None):
+        """
+        Admit an upload of size bytes (the declared Content-Length; None when
+        unknown, which reserves the largest allowed upload) from client
+        Returns an AdmissionTicket or raises AdmissionRejected.
+        """
+        size = size if size is not None else self.max_upload_size
+        backlog = self.backlog() if self.backlog else 0
+
+        with self._state() as state:
+            tickets = state['tickets'].values()
+            active = sum(ticket['weight'] for ticket in tickets)
+            inflight_bytes = sum(ticket['size'] for ticket in tickets)
+            job_seconds = state['job_seconds']
+
+            queued = active + backlog
+            if queued >= self.max_queue:
+                self._reject('Server busy: processing queue is full', 503, queued - self.max_queue + 1, job_seconds)
+
+            # Fair share of the queue among the clients with uploads in flight
+            holding = sum(ticket['weight'] for ticket in tickets if ticket['client'] == client)
+            competing = len({ticket['client'] for ticket in tickets} | {client})
+            if holding >= max(1, self.max_queue // competing):
+                self._reject('Too many uploads in progress for this client', 429, holding, job_seconds)
+
+            if active and inflight_bytes + size > self.max_inflight_bytes:
+                self._reject('Server busy: too much upload data in flight', 503, 1, job_seconds)
+
+            free_disk = shutil.disk_usage(self.upload_folder).free - inflight_bytes
+            if free_disk - size < self.min_free_disk:
+                self._reject('Server busy: not enough free disk space', 503, max(1, active), job_seconds)
+
+            memory = available_memory()
+            if memory is not None and memory < self.min_free_memory:
+                self._reject('Server busy: not enough free memory', 503, max(1, active), job_seconds)
+
+            ticket_id = uuid.uuid4().hex
+            state['tickets'][ticket_id] = {'pid': os.getpid(), 'client': client, 'size': size, 'weight': 1}
+
+        return AdmissionTicket(self, ticket_id, client, size)
+
+    def _reweigh(self, ticket, weight):
+        backlog = self.backlog() if self.backlog else 0
+        with self._state() as state:
+            others = backlog + sum(t['weight'] for ticket_id, t in state['tickets'].items()
+                                   if ticket_id != ticket.id)
+            # A batch larger than the whole queue is still let in when it has the queue to itself
+            if others and others + weight > self.max_queue:
+                self._reject('Server busy: processing queue is full', 503, others + weight - self.max_queue,
+                             state['job_seconds'])
+            if ticket.id in state['tickets']:
+                state['tickets'][ticket.id]['weight'] = weight
+
+    def _release(self, ticket):
+        with self._state() as state:
+            state['tickets'].pop(ticket.id, None)
+
+            duration = (time.monotonic() - ticket.started) / ticket.weight
+            state['job_seconds'] += DURATION_SMOOTHING * (duration - state['job_seconds'])
+
+    def _reject(self, message, status, jobs_ahead, job_seconds):
+        # Roughly when jobs_ahead uploads will have been processed by the workers
+        retry_after = math.ceil(job_seconds * jobs_ahead / self.workers)
+        raise AdmissionRejected(message, status, min(MAX_RETRY_AFTER, max(1, retry_after)))
+
+    def stats(self):
+        backlog = self.backlog() if self.backlog else 0
+        # Read only: writes replace the file whole, so no lock is needed
+        state = self._read_state()
+        tickets = state['tickets'].values()
+        return {
+            'active_uploads': sum(ticket['weight'] for ticket in tickets),
+            'queued_jobs': backlog,
+            'max_queue': self.max_queue,
+            'inflight_bytes': sum(ticket['size'] for ticket in tickets),
+            'clients': len({ticket['client'] for ticket in tickets}),
+            'average_processing_seconds': round(state['job_seconds'], 2)
+        }
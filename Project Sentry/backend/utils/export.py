@@ -0,0 +1,54 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+ROWS_PER_CHUNK = 500  # rows buffered into each chunk sent to the client
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _ndjson_chunks(columns, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({c: _serialize(v) for c, v in zip(columns, row)}))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def _csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_serialize(v) for v in row])
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_response(columns, rows, export_format, filename):
+    """
+    Streamed NDJSON or CSV download of rows
+    rows is a lazy iterable of tuples (e.g. a streaming database result); it
+    is consumed chunk by chunk while the response is sent, so memory stays
+    constant however many rows there are.
+    """
+    chunks = _csv_chunks(columns, rows) if export_format == 'csv' else _ndjson_chunks(columns, rows)
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    )
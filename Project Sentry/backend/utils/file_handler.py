@@ -1,27 +1,236 @@
+import gzip
 import os
+import shutil
+import struct
 import uuid
+import zipfile
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
 
+from utils.storage import LocalStorage
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Suffix added to stored .ifc files for each at-rest compression setting
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+# zstd skippable frame appended to stored .zst files: magic, payload length and
+# the uncompressed size (decoders skip it)
+ZSTD_SIZE_FRAME = struct.Struct('<IIQ')
+ZSTD_SIZE_MAGIC = 0x184D2A5E
+
+class UploadRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def is_compressed(file_path):
+    """True if a stored model has to be decompressed before parsing"""
+    return file_path.lower().endswith(('.ifczip', '.gz', '.zst'))
+
+@contextmanager
+def open_stream(file_path):
+    """Binary stream of the IFC text of a stored model, decompressed on the fly"""
+    lower = file_path.lower()
+
+    if lower.endswith('.ifczip'):
+        with zipfile.ZipFile(file_path) as archive:
+            members = [name for name in archive.namelist() if name.lower().endswith('.ifc')]
+            if not members:
+                raise Exception("No .ifc file found in .ifczip archive")
+            with archive.open(members[0]) as stream:
+                yield stream
+
+    elif lower.endswith('.gz'):
+        with gzip.open(file_path, 'rb') as stream:
+            yield stream
+
+    elif lower.endswith('.zst'):
+        import zstandard
+        with open(file_path, 'rb') as raw, zstandard.ZstdDecompressor().stream_reader(raw) as stream:
+            yield stream
+
+    else:
+        with open(file_path, 'rb') as stream:
+            yield stream
+
+def content_size(file_path):
+    """Uncompressed size of the IFC text of a stored model, as recorded when it was written"""
+    lower = file_path.lower()
+
+    if lower.endswith('.ifczip'):
+        with zipfile.ZipFile(file_path) as archive:
+            members = [member for member in archive.infolist() if member.filename.lower().endswith('.ifc')]
+            return members[0].file_size if members else 0
+
+    if lower.endswith('.gz'):
+        # gzip trailer (ISIZE: the size modulo 4 GiB, beyond any upload limit)
+        with open(file_path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), 'little')
+
+    if lower.endswith('.zst'):
+        with open(file_path, 'rb') as f:
+            f.seek(-ZSTD_SIZE_FRAME.size, os.SEEK_END)
+            magic, length, size = ZSTD_SIZE_FRAME.unpack(f.read(ZSTD_SIZE_FRAME.size))
+        if magic == ZSTD_SIZE_MAGIC and length == 8:
+            return size
+
+        # Stored without the size frame: count while decompressing
+        size = 0
+        with open_stream(file_path) as stream:
+            while chunk := stream.read(COPY_CHUNK_SIZE):
+                size += len(chunk)
+        return size
+
+    return os.path.getsize(file_path)
+
+class ZstdUploadWriter:
+    """zstd stream writer that records the uncompressed size in a trailing skippable frame"""
+
+    def __init__(self, file_path, level=3):
+        import zstandard
+        self.raw = open(file_path, 'wb')
+        self.stream = zstandard.ZstdCompressor(level=level).stream_writer(self.raw, closefd=False)
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return self.stream.write(data)
+
+    def close(self):
+        if self.raw.closed:
+            return
+        self.stream.close()
+        self.raw.write(ZSTD_SIZE_FRAME.pack(ZSTD_SIZE_MAGIC, 8, self.size))
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
 class FileHandler:
-    def __init__(self, upload_folder):
+    def __init__(self, upload_folder, compression=None, storage=None, max_model_size=None):
         self.upload_folder = upload_folder
-        self.allowed_extensions = {'ifc', 'IFC'}
+        self.max_model_size = max_model_size
+        self.storage = storage or LocalStorage(upload_folder)
+        self.allowed_extensions = {'ifc', 'ifczip'}
+        self.compression = None if compression in (None, '', 'none') else compression
+        if self.compression and self.compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported storage compression: {compression}")
 
     def allowed_file(self, filename):
         """Check if file has an allowed extension"""
         return '.' in filename and \
-               filename.rsplit('.', 1)[1] in self.allowed_extensions
+               filename.rsplit('.', 1)[1].lower() in self.allowed_extensions
 
-    def save_file(self, file, filename):
-        """Save uploaded file with unique name"""
+    def unique_path(self, filename):
+        """Return a unique path in the upload folder for filename"""
         # Generate unique filename to avoid conflicts
         name, ext = os.path.splitext(filename)
         unique_filename = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
 
-        file_path = os.path.join(self.upload_folder, unique_filename)
-        file.save(file_path)
+        return os.path.join(self.upload_folder, unique_filename)
+
+    def create_upload(self, filename):
+        """
+        Open a new stored file for an upload
+        Returns (file_path, writable binary file). Plain .ifc uploads are
+        compressed as they are written when storage compression is enabled;
+        .ifczip archives are already compressed and kept as they are.
+        """
+        file_path = self.unique_path(filename)
+        if not self.compression or filename.lower().endswith('.ifczip'):
+            return file_path, open(file_path, 'wb')
+
+        file_path += COMPRESSION_SUFFIXES[self.compression]
+        if self.compression == 'gzip':
+            return file_path, gzip.open(file_path, 'wb', compresslevel=6)
+
+        return file_path, ZstdUploadWriter(file_path)
+
+    def save_file(self, file, filename):
+        """Save uploaded file with unique name"""
+        return self.save_stream(file.stream, filename)
+
+    def save_stream(self, stream, filename):
+        """Save a binary stream as a new upload; returns its storage key"""
+        file_path, out = self.create_upload(filename)
+        try:
+            with out:
+                shutil.copyfileobj(stream, out, COPY_CHUNK_SIZE)
+        except Exception:
+            # e.g. a corrupt archive member; don't leave the partial file behind
+            os.remove(file_path)
+            raise
+
+        return self.store_upload(file_path)
+
+    def store_upload(self, file_path):
+        """
+        Put a finished upload into storage; returns its key
+        Raises UploadRejected (and drops the file) for a corrupt .ifczip and
+        for a model that decompresses past max_model_size, e.g. an .ifczip
+        declaring a huge member.
+        """
+        try:
+            size = content_size(file_path)
+        except zipfile.BadZipFile:
+            os.remove(file_path)
+            raise UploadRejected(f"Invalid .ifczip archive: {os.path.basename(file_path)}")
+
+        if self.max_model_size and size > self.max_model_size:
+            os.remove(file_path)
+            raise UploadRejected(f"Model too large when decompressed "
+                                 f"(max {self.max_model_size / (1024*1024):.0f} MB)", 413)
+        return self.store(file_path)
+
+    def store(self, file_path):
+        """Put a finished local file into storage; returns its key"""
+        return self.storage.put(file_path)
+
+    def local_path(self, key):
+        """Local file with the content of a stored upload, fetched when this node lacks it"""
+        return self.storage.fetch(key)
+
+    def content_size(self, key):
+        """Uncompressed size of a stored upload's IFC text"""
+        return content_size(self.local_path(key))
+
+    def is_archive(self, filename):
+        """Check if an upload is a .zip archive of several models"""
+        return filename.lower().endswith('.zip')
+
+    def _archive_members(self, archive):
+        for member in archive.infolist():
+            filename = secure_filename(os.path.basename(member.filename))
+            if not member.is_dir() and self.allowed_file(filename):
+                yield member, filename
+
+    def count_archive_models(self, file):
+        """
+        Number of models in an uploaded .zip archive and their total uncompressed
+        size, read from its directory (extraction stops at the declared sizes)
+        """
+        with zipfile.ZipFile(file.stream) as archive:
+            members = [member for member, _ in self._archive_members(archive)]
+            return len(members), sum(member.file_size for member in members)
 
-        return file_path
+    def save_archive(self, file):
+        """
+        Save every model in an uploaded .zip archive
+        Yields (filename, storage key) as each member is saved, so callers can
+        start processing one model while the next is still being extracted
+        """
+        with zipfile.ZipFile(file.stream) as archive:
+            for member, filename in self._archive_members(archive):
+                with archive.open(member) as stream:
+                    yield filename, self.save_stream(stream, filename)
 
     def delete_file(self, file_path):
         """Delete file if it exists"""
@@ -0,0 +1,112 @@
+"""
+Storage backends for uploaded models and the files derived from them
+
+Uploads are written to the local upload folder first (see FileHandler) and then
+put into a backend, which returns the key stored as Project.file_path. Any node
+can fetch a key back into a local file for processing.
+
+LocalStorage keeps everything in the upload folder and its keys are the file
+paths themselves, so a single node (and every existing project row) behaves as
+before. DirectoryObjectStorage has object-store semantics (whole-object puts and
+gets under flat keys, fetched into a local cache) on top of a directory, e.g. a
+shared volume; it is also the stand-in to test multi-node setups with before
+an S3-style backend is plugged in behind the same interface.
+"""
+import os
+import shutil
+import uuid
+
+class StorageBackend:
+    """Interface every backend implements"""
+
+    def put(self, local_path):
+        """Store a local file; returns its key"""
+        raise NotImplementedError
+
+    def fetch(self, key):
+        """Local path holding the object's content (raises FileNotFoundError when unknown)"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        raise NotImplementedError
+
+    def size(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root):
+        self.root = root
+
+    def put(self, local_path):
+        return local_path
+
+    def fetch(self, key):
+        if not os.path.exists(key):
+            raise FileNotFoundError(key)
+        return key
+
+    def exists(self, key):
+        return os.path.exists(key)
+
+    def size(self, key):
+        return os.path.getsize(key)
+
+    def delete(self, key):
+        if os.path.exists(key):
+            os.remove(key)
+
+class DirectoryObjectStorage(StorageBackend):
+    def __init__(self, bucket, cache_dir):
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        os.makedirs(bucket, exist_ok=True)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _object_path(self, key):
+        if os.path.basename(key) != key:
+            raise ValueError(f"Invalid storage key: {key}")
+        return os.path.join(self.bucket, key)
+
+    def _copy(self, source, target):
+        # Write then rename, so readers never see a partial object
+        partial = f"{target}.{uuid.uuid4().hex[:8]}.part"
+        shutil.copyfile(source, partial)
+        os.replace(partial, target)
+
+    def put(self, local_path):
+        key = os.path.basename(local_path)
+        self._copy(local_path, self._object_path(key))
+        return key
+
+    def fetch(self, key):
+        cached = os.path.join(self.cache_dir, key)
+        if not os.path.exists(cached):
+            self._copy(self._object_path(key), cached)
+        return cached
+
+    def exists(self, key):
+        return os.path.exists(self._object_path(key))
+
+    def size(self, key):
+        return os.path.getsize(self._object_path(key))
+
+    def delete(self, key):
+        for path in (self._object_path(key), os.path.join(self.cache_dir, key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+BACKENDS = ('local', 'directory')
+
+def create_storage(config):
+    """Storage backend selected by STORAGE_BACKEND"""
+    backend = config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if backend == 'directory':
+        if not config['STORAGE_BUCKET']:
+            raise ValueError("STORAGE_BUCKET is required for the directory storage backend")
+        return DirectoryObjectStorage(config['STORAGE_BUCKET'], config['UPLOAD_FOLDER'])
+    raise ValueError(f"Unsupported storage backend: {backend} (expected one of {', '.join(BACKENDS)})")
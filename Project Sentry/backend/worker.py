@@ -0,0 +1,114 @@
+"""
+Processing worker node
+
+Run with: python worker.py (configured like the web app; all nodes share
+DATABASE_URL and, with STORAGE_BACKEND = 'directory', STORAGE_BUCKET)
+
+Claims the processing jobs queued by uploads in PROCESSING_MODE = 'queue',
+fetches each model from storage, processes it and saves the results. While a
+job runs a heartbeat thread renews its lease; if a worker dies its lease runs
+out and another worker takes the job over, and the ownership check on saving
+(see the job helpers in app.py) keeps a model from being stored twice. Start as
+many workers as needed, on as many machines.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+
+from app import create_app, db, Project, analyze_file, claim_job, renew_lease, complete_job, fail_job
+
+app = create_app(os.environ.get('FLASK_CONFIG'))
+file_handler = app.extensions['file_handler']
+worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def in_app_context(func, *args):
+    """Run a database call with an app context and a fresh session"""
+    with app.app_context():
+        try:
+            return func(*args)
+        finally:
+            db.session.remove()
+
+
+class Heartbeat(threading.Thread):
+    """Renews a job's lease until stopped; sets lost once the job was taken over"""
+
+    def __init__(self, job):
+        super().__init__(daemon=True)
+        self.job = job
+        self.interval = app.config['JOB_LEASE_SECONDS'] / 3
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                if not in_app_context(renew_lease, self.job, worker_id):
+                    self.lost.set()
+                    return
+            except Exception as e:
+                # Try again next beat; the lease only lapses after JOB_LEASE_SECONDS
+                print(f"Heartbeat error for job {self.job.id}: {str(e)}")
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def claim():
+    """Next job and the storage key of its model, or None"""
+    job = claim_job(worker_id)
+    if job is None:
+        return None
+    return job, db.session.get(Project, job.project_id).file_path
+
+
+def process_job(job, file_path):
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        results = analyze_file(file_handler.local_path(file_path))
+        error = None
+    except Exception as e:
+        results, error = None, e
+    finally:
+        heartbeat.stop()
+
+    if not heartbeat.lost.is_set():
+        if error is None:
+            saved = in_app_context(complete_job, job, worker_id, results)
+        else:
+            saved = in_app_context(fail_job, job, worker_id, error)
+        if saved:
+            return
+
+    print(f"Lost the lease on job {job.id}; another worker has taken it over")
+
+
+def main():
+    print(f"Worker {worker_id} waiting for jobs")
+    while True:
+        try:
+            claimed = in_app_context(claim)
+        except Exception as e:
+            print(f"Job claim error: {str(e)}")
+            claimed = None
+
+        if claimed is None:
+            time.sleep(app.config['JOB_POLL_INTERVAL'])
+            continue
+
+        try:
+            process_job(*claimed)
+        except Exception as e:
+            # e.g. the database was unreachable while saving; the job's lease
+            # runs out and it is claimed again
+            print(f"Job processing error: {str(e)}")
+            time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+
+if __name__ == '__main__':
+    main()
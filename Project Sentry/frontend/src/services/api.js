@@ -58,6 +58,27 @@ export const apiService = {
     });
   },
 
+  // Federated upload: several discipline models (or a .zip of them) at once
+  uploadBatch: async (files, onProgress) => {
+    const formData = new FormData();
+    Array.from(files).forEach((file) => formData.append('files', file));
+
+    return api.post('/upload/batch', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+      timeout: 0,
+      onUploadProgress: (progressEvent) => {
+        if (onProgress) {
+          const percentCompleted = Math.round(
+            (progressEvent.loaded * 100) / progressEvent.total
+          );
+          onProgress(percentCompleted);
+        }
+      },
+    });
+  },
+
   // Dashboard
   getDashboard: () => api.get('/dashboard'),
 